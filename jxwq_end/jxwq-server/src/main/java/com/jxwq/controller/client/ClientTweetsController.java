@@ -339,9 +339,10 @@ public class ClientTweetsController {
     public AjaxResult getRecommendations(@RequestBody JSONObject jsonObject) {
         Integer clientUserId = BaseContext.getCurrentUserInfo().getId(); // 获取当前用户Id
         Integer topN = jsonObject.getInteger("topN"); // 推荐数量
+        Integer offset = jsonObject.getInteger("offset"); // 分页偏移（可选，下拉加载更多时传已加载的数量）
         
         // 使用配置的推荐方法（默认hybrid：混合推荐）
-        List<Integer> recommendationIds = recommendationService.getRecommendations(clientUserId, null, topN);
+        List<Integer> recommendationIds = recommendationService.getRecommendations(clientUserId, null, topN, offset);
 
         // 根据推荐ID获取推文详情
         if (recommendationIds.isEmpty()) {
@@ -2,10 +2,26 @@ package com.jxwq.service.client;
 
 import com.alibaba.fastjson2.JSONObject;
 import lombok.extern.slf4j.Slf4j;
+import org.apache.http.client.config.RequestConfig;
+import org.apache.http.client.methods.CloseableHttpResponse;
+import org.apache.http.client.methods.HttpGet;
+import org.apache.http.client.methods.HttpPost;
+import org.apache.http.client.methods.HttpRequestBase;
+import org.apache.http.client.utils.URIBuilder;
+import org.apache.http.entity.ContentType;
+import org.apache.http.entity.StringEntity;
+import org.apache.http.impl.client.CloseableHttpClient;
+import org.apache.http.impl.client.HttpClients;
+import org.apache.http.impl.conn.PoolingHttpClientConnectionManager;
+import org.apache.http.util.EntityUtils;
 import org.springframework.beans.factory.annotation.Value;
 import org.springframework.stereotype.Service;
+import org.springframework.util.StringUtils;
 
+import javax.annotation.PostConstruct;
+import javax.annotation.PreDestroy;
 import java.io.BufferedReader;
+import java.io.IOException;
 import java.io.InputStreamReader;
 import java.nio.charset.StandardCharsets;
 import java.util.ArrayList;
@@ -37,7 +53,7 @@ public class RecommendationService {
 
     /**
      * 推荐方法：hybrid（混合推荐，协同过滤+内容过滤）
-     * 支持的方法：collaborative/cf, content/cb, hybrid, popular
+     * 支持的方法：collaborative/cf, item/itemcf, content/cb, hybrid, popular
      */
     @Value("${recommendation.service.method:hybrid}")
     private String recommendationMethod;
@@ -48,6 +64,102 @@ public class RecommendationService {
     @Value("${recommendation.service.count:20}")
     private Integer recommendationCount;
 
+    /**
+     * 常驻推荐服务地址（如 http://127.0.0.1:5001），为空时逐次执行Python脚本
+     */
+    @Value("${recommendation.service.url:}")
+    private String recommendationServiceUrl;
+
+    /**
+     * 请求常驻推荐服务的连接/读取超时（毫秒），与 HttpClientUtil 的 POST 请求一致
+     */
+    @Value("${recommendation.service.timeout:5000}")
+    private Integer recommendationServiceTimeout;
+
+    /**
+     * 常驻推荐服务的最大并发连接数
+     */
+    @Value("${recommendation.service.max-connections:50}")
+    private Integer recommendationServiceMaxConnections;
+
+    /**
+     * 请求常驻推荐服务的共享连接池客户端（所有请求都带超时，推荐服务卡住时不会一直占用请求线程）
+     */
+    private CloseableHttpClient recommendationHttpClient;
+
+    @PostConstruct
+    public void initHttpClient() {
+        PoolingHttpClientConnectionManager connectionManager = new PoolingHttpClientConnectionManager();
+        connectionManager.setMaxTotal(recommendationServiceMaxConnections);
+        connectionManager.setDefaultMaxPerRoute(recommendationServiceMaxConnections);
+        RequestConfig requestConfig = RequestConfig.custom()
+                .setConnectTimeout(recommendationServiceTimeout)
+                .setConnectionRequestTimeout(recommendationServiceTimeout)
+                .setSocketTimeout(recommendationServiceTimeout).build();
+        recommendationHttpClient = HttpClients.custom()
+                .setConnectionManager(connectionManager)
+                .setDefaultRequestConfig(requestConfig)
+                .build();
+    }
+
+    @PreDestroy
+    public void closeHttpClient() throws IOException {
+        if (recommendationHttpClient != null) {
+            recommendationHttpClient.close();
+        }
+    }
+
+    /**
+     * 请求常驻推荐服务（server.py）并获取结果
+     *
+     * @param path   接口路径（如 /recommendations）
+     * @param params 请求参数
+     * @return JSONObject格式的结果
+     */
+    private JSONObject requestRecommendationServer(String path, Map<String, String> params) {
+        return requestRecommendationServer(path, params, false);
+    }
+
+    /**
+     * 请求常驻推荐服务（server.py）并获取结果
+     *
+     * @param path   接口路径（如 /batch_recommendations）
+     * @param params 请求参数
+     * @param post   是否以JSON请求体POST发送
+     * @return JSONObject格式的结果
+     */
+    private JSONObject requestRecommendationServer(String path, Map<String, String> params, boolean post) {
+        try {
+            String url = recommendationServiceUrl + path;
+            HttpRequestBase request;
+            if (post) {
+                HttpPost httpPost = new HttpPost(url);
+                httpPost.setEntity(new StringEntity(new JSONObject(params).toString(), ContentType.APPLICATION_JSON));
+                request = httpPost;
+            } else {
+                URIBuilder builder = new URIBuilder(url);
+                for (Map.Entry<String, String> param : params.entrySet()) {
+                    builder.addParameter(param.getKey(), param.getValue());
+                }
+                request = new HttpGet(builder.build());
+            }
+
+            try (CloseableHttpResponse response = recommendationHttpClient.execute(request)) {
+                String resultString = response.getEntity() != null
+                        ? EntityUtils.toString(response.getEntity(), StandardCharsets.UTF_8) : null;
+                if (resultString == null || resultString.trim().isEmpty()) {
+                    log.error("推荐服务返回空结果: {}，状态码: {}", path, response.getStatusLine().getStatusCode());
+                    return null;
+                }
+                // 非200响应同样是 {code, data, message} 结构，由调用方按 code 处理
+                return JSONObject.parseObject(resultString);
+            }
+        } catch (Exception e) {
+            log.error("请求推荐服务异常: {}", e.getMessage(), e);
+            return null;
+        }
+    }
+
     /**
      * 执行Python脚本并获取结果
      *
@@ -149,27 +261,53 @@ public class RecommendationService {
      * 获取用户推荐（使用传统推荐算法）
      *
      * @param userId 用户ID
-     * @param method 推荐方法（collaborative/cf, content/cb, hybrid, popular）
+     * @param method 推荐方法（collaborative/cf, item/itemcf, content/cb, hybrid, popular）
      * @param topN   推荐数量（可选，默认使用配置的数量）
      * @return 推荐推文ID列表
      */
     public List<Integer> getRecommendations(Integer userId, String method, Integer topN) {
+        return getRecommendations(userId, method, topN, 0);
+    }
+
+    /**
+     * 分页获取用户推荐（推荐服务缓存一个较深的列表，各页从中截取，翻页不会重新计算）
+     *
+     * @param userId 用户ID
+     * @param method 推荐方法（collaborative/cf, item/itemcf, content/cb, hybrid, popular）
+     * @param topN   每页数量（可选，默认使用配置的数量）
+     * @param offset 分页偏移（第一页为0）
+     * @return 推荐推文ID列表，翻到底时为空
+     */
+    public List<Integer> getRecommendations(Integer userId, String method, Integer topN, Integer offset) {
         try {
             // 准备参数（使用配置的方法或传入的方法）
             String finalMethod = (method != null && !method.isEmpty()) ? method : recommendationMethod;
             // 如果传入的是无效方法，使用默认的hybrid
-            if (!finalMethod.matches("collaborative|cf|content|cb|hybrid|popular")) {
+            if (!finalMethod.matches("collaborative|cf|item|itemcf|content|cb|hybrid|popular")) {
                 finalMethod = "hybrid";
             }
             Integer finalTopN = (topN != null && topN > 0) ? topN : recommendationCount;
+            Integer finalOffset = (offset != null && offset > 0) ? offset : 0;
             
-            // 执行Python脚本
-            JSONObject jsonResponse = executePythonScript(
-                "get_recommendations.py",
-                String.valueOf(userId),
-                finalMethod,
-                String.valueOf(finalTopN)
-            );
+            JSONObject jsonResponse;
+            if (StringUtils.hasText(recommendationServiceUrl)) {
+                // 请求常驻推荐服务
+                Map<String, String> params = new HashMap<>();
+                params.put("user_id", String.valueOf(userId));
+                params.put("method", finalMethod);
+                params.put("top_n", String.valueOf(finalTopN));
+                params.put("offset", String.valueOf(finalOffset));
+                jsonResponse = requestRecommendationServer("/recommendations", params);
+            } else {
+                // 执行Python脚本
+                jsonResponse = executePythonScript(
+                    "get_recommendations.py",
+                    String.valueOf(userId),
+                    finalMethod,
+                    String.valueOf(finalTopN),
+                    String.valueOf(finalOffset)
+                );
+            }
             
             if (jsonResponse != null && jsonResponse.getInteger("code") == 200) {
                 List<Integer> recommendations = new ArrayList<>();
@@ -207,11 +345,19 @@ public class RecommendationService {
         try {
             Integer finalTopN = (topN != null && topN > 0) ? topN : recommendationCount;
             
-            // 执行Python脚本
-            JSONObject jsonResponse = executePythonScript(
-                "get_popular.py",
-                String.valueOf(finalTopN)
-            );
+            JSONObject jsonResponse;
+            if (StringUtils.hasText(recommendationServiceUrl)) {
+                // 请求常驻推荐服务
+                Map<String, String> params = new HashMap<>();
+                params.put("top_n", String.valueOf(finalTopN));
+                jsonResponse = requestRecommendationServer("/popular", params);
+            } else {
+                // 执行Python脚本
+                jsonResponse = executePythonScript(
+                    "get_popular.py",
+                    String.valueOf(finalTopN)
+                );
+            }
             
             if (jsonResponse != null && jsonResponse.getInteger("code") == 200) {
                 List<Integer> popularItems = new ArrayList<>();
@@ -234,9 +380,50 @@ public class RecommendationService {
         return new ArrayList<>();
     }
 
+    /**
+     * 把推荐反馈交给常驻推荐服务（立即更新在线学习参数并清除推荐缓存，由推荐服务批量写库）
+     *
+     * @param userId   用户ID
+     * @param tweetsId 推文ID
+     * @param feedback 反馈类型：like / dislike
+     * @return 推荐服务已接收返回true；未配置推荐服务或调用失败返回false，由调用方直接写库
+     */
+    public boolean submitFeedback(Integer userId, Integer tweetsId, String feedback) {
+        if (userId == null || tweetsId == null || !StringUtils.hasText(recommendationServiceUrl)) {
+            return false;
+        }
+        Map<String, String> params = new HashMap<>();
+        params.put("user_id", String.valueOf(userId));
+        params.put("tweets_id", String.valueOf(tweetsId));
+        params.put("feedback", feedback);
+        JSONObject jsonResponse = requestRecommendationServer("/feedback", params, true);
+        if (jsonResponse == null || jsonResponse.getInteger("code") != 200) {
+            log.warn("推荐服务接收用户 {} 的反馈失败，改为直接写库", userId);
+            return false;
+        }
+        return true;
+    }
+
+    /**
+     * 清除用户的推荐缓存（用户反馈写入后调用，仅常驻推荐服务模式生效）
+     *
+     * @param userId 用户ID
+     */
+    public void invalidateUserCache(Integer userId) {
+        if (userId == null || !StringUtils.hasText(recommendationServiceUrl)) {
+            return;
+        }
+        Map<String, String> params = new HashMap<>();
+        params.put("user_id", String.valueOf(userId));
+        JSONObject jsonResponse = requestRecommendationServer("/cache/invalidate", params, true);
+        if (jsonResponse == null || jsonResponse.getInteger("code") != 200) {
+            log.warn("清除用户 {} 推荐缓存失败", userId);
+        }
+    }
+
     /**
      * 批量获取推荐
-     * 批量推荐是循环调用单个推荐方法
+     * 一次调用推荐服务（或一次执行Python脚本）计算所有用户的推荐
      *
      * @param userIds 用户ID列表
      * @param method  推荐方法
@@ -247,9 +434,61 @@ public class RecommendationService {
         Map<Integer, List<Integer>> results = new HashMap<>();
         
         try {
-            // 循环调用单个推荐方法
+            String finalMethod = (method != null && !method.isEmpty()) ? method : recommendationMethod;
+            if (!finalMethod.matches("collaborative|cf|item|itemcf|content|cb|hybrid|popular")) {
+                finalMethod = "hybrid";
+            }
+            Integer finalTopN = (topN != null && topN > 0) ? topN : recommendationCount;
+            StringBuilder userIdsBuilder = new StringBuilder();
+            for (Integer userId : userIds) {
+                if (userId != null) {
+                    if (userIdsBuilder.length() > 0) {
+                        userIdsBuilder.append(",");
+                    }
+                    userIdsBuilder.append(userId);
+                }
+            }
+
+            JSONObject jsonResponse = null;
+            if (userIdsBuilder.length() > 0) {
+                if (StringUtils.hasText(recommendationServiceUrl)) {
+                    // 请求常驻推荐服务
+                    Map<String, String> params = new HashMap<>();
+                    params.put("user_ids", userIdsBuilder.toString());
+                    params.put("method", finalMethod);
+                    params.put("top_n", String.valueOf(finalTopN));
+                    jsonResponse = requestRecommendationServer("/batch_recommendations", params, true);
+                } else {
+                    // 执行Python脚本（所有用户共用一个进程）
+                    jsonResponse = executePythonScript(
+                        "get_batch_recommendations.py",
+                        userIdsBuilder.toString(),
+                        finalMethod,
+                        String.valueOf(finalTopN)
+                    );
+                }
+            }
+
+            JSONObject data = (jsonResponse != null && jsonResponse.getInteger("code") == 200)
+                    ? jsonResponse.getJSONObject("data") : null;
+            List<Integer> popularItems = null;
             for (Integer userId : userIds) {
-                List<Integer> recommendations = getRecommendations(userId, method, topN);
+                List<Integer> recommendations = new ArrayList<>();
+                List<Object> items = data != null ? data.getList(String.valueOf(userId), Object.class) : null;
+                if (items != null) {
+                    for (Object item : items) {
+                        if (item instanceof Number) {
+                            recommendations.add(((Number) item).intValue());
+                        }
+                    }
+                }
+                if (recommendations.isEmpty()) {
+                    // 失败或无结果时返回热门物品
+                    if (popularItems == null) {
+                        popularItems = getPopularItems(finalTopN);
+                    }
+                    recommendations = new ArrayList<>(popularItems);
+                }
                 results.put(userId, recommendations);
             }
             
@@ -4,6 +4,7 @@ import com.baomidou.mybatisplus.core.conditions.query.LambdaQueryWrapper;
 import com.jxwq.entity.RecommendationFeedback;
 import com.jxwq.mapper.RecommendationFeedbackMapper;
 import com.jxwq.service.client.RecommendationFeedbackService;
+import com.jxwq.service.client.RecommendationService;
 import org.springframework.stereotype.Service;
 import org.springframework.util.StringUtils;
 
@@ -15,6 +16,9 @@ public class RecommendationFeedbackServiceImpl implements RecommendationFeedback
     @Resource
     private RecommendationFeedbackMapper recommendationFeedbackMapper;
 
+    @Resource
+    private RecommendationService recommendationService;
+
     @Override
     public void saveFeedback(Integer userId, Integer tweetsId, String feedback) {
         if (userId == null || tweetsId == null || !StringUtils.hasText(feedback)) {
@@ -26,6 +30,11 @@ public class RecommendationFeedbackServiceImpl implements RecommendationFeedback
             return;
         }
 
+        // 优先交给常驻推荐服务：立即生效，数据库写入由推荐服务批量完成
+        if (recommendationService.submitFeedback(userId, tweetsId, normalized)) {
+            return;
+        }
+
         // 可选：同一用户对同一推文的最新反馈覆盖旧反馈
         LambdaQueryWrapper<RecommendationFeedback> wrapper = new LambdaQueryWrapper<>();
         wrapper.eq(RecommendationFeedback::getClientUserId, userId)
@@ -39,6 +48,9 @@ public class RecommendationFeedbackServiceImpl implements RecommendationFeedback
         feedbackEntity.setReward("like".equals(normalized) ? 1 : -1);
 
         recommendationFeedbackMapper.insert(feedbackEntity);
+
+        // 反馈会改变推荐排序，清除该用户的推荐缓存
+        recommendationService.invalidateUserCache(userId);
     }
 }
 
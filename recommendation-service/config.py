@@ -24,15 +24,71 @@ class Config:
     # 推荐参数
     RECOMMENDATION_COUNT = int(os.getenv('RECOMMENDATION_COUNT', 20))
     CACHE_EXPIRE_TIME = int(os.getenv('CACHE_EXPIRE_TIME', 3600))
+    CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 1800))  # 软过期（CACHE_EXPIRE_TIME）后仍可返回旧推荐的时长（秒），期间后台刷新（仅常驻服务 server.py，命令行脚本同步重新计算）
+    CACHE_TTL_JITTER = float(os.getenv('CACHE_TTL_JITTER', 0.1))  # 缓存过期时间随机抖动比例（±）
+    CACHE_REFRESH_WORKERS = int(os.getenv('CACHE_REFRESH_WORKERS', 4))  # 同时进行的后台缓存刷新数
+    CACHE_REFRESH_LOCK_TTL = int(os.getenv('CACHE_REFRESH_LOCK_TTL', 30))  # 后台刷新Redis锁的过期时间（秒）
+    RECOMMENDATION_CACHE_DEPTH = int(os.getenv('RECOMMENDATION_CACHE_DEPTH', 100))  # 每个用户/方法计算并缓存的推荐条数，top_n 和分页从中截取
+    LOCAL_CACHE_SIZE = int(os.getenv('LOCAL_CACHE_SIZE', 10000))  # 进程内缓存最大键数
+    LOCAL_CACHE_TTL = int(os.getenv('LOCAL_CACHE_TTL', 60))  # 进程内缓存过期时间（秒），应小于 CACHE_EXPIRE_TIME
+    BATCH_BLOCK_SIZE = int(os.getenv('BATCH_BLOCK_SIZE', 256))  # 批量推荐时每块计算相似度的用户数
+    SQL_IN_BATCH_SIZE = int(os.getenv('SQL_IN_BATCH_SIZE', 100))  # 批量查询 IN (...) 每批的固定ID个数（不足时补齐，SQL形状不变）
+
+    # 离线预计算参数（precompute_recommendations.py）
+    PRECOMPUTE_ACTIVE_DAYS = int(os.getenv('PRECOMPUTE_ACTIVE_DAYS', 7))  # 预计算最近N天活跃的用户
+    PRECOMPUTE_WORKERS = int(os.getenv('PRECOMPUTE_WORKERS', os.cpu_count() or 1))  # 并行进程数
+    PRECOMPUTE_SHARD_SIZE = int(os.getenv('PRECOMPUTE_SHARD_SIZE', 200))  # 每个分片的用户数
 
     DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
     DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
     DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+
+    # 常驻服务配置（server.py）
+    SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', 5001))
     
     # 推荐算法参数
+    HYBRID_WORKERS = int(os.getenv('HYBRID_WORKERS', 8))  # 混合推荐并行分支的线程数（应不超过数据库连接池容量）
+    HYBRID_BRANCH_TIMEOUT = float(os.getenv('HYBRID_BRANCH_TIMEOUT', 3.0))  # 混合推荐并行分支的超时时间（秒，从提交分支开始计算）
     SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.1))  # 协同过滤相似度阈值
+    MATRIX_SNAPSHOT_TTL = int(os.getenv('MATRIX_SNAPSHOT_TTL', 600))  # 用户-物品矩阵快照最长使用时间（秒）
+    MATRIX_STALENESS = int(os.getenv('MATRIX_STALENESS', 30))  # 快照允许的最大陈旧时间（秒），超过后检测数据变化
+    CANDIDATE_POOL_SIZE = int(os.getenv('CANDIDATE_POOL_SIZE', 200))  # 内容过滤共享候选池大小（按热度取前N条）
+    CANDIDATE_POOL_TTL = int(os.getenv('CANDIDATE_POOL_TTL', 300))  # 候选池刷新间隔（秒）
+    TRENDING_HALF_LIFE = float(os.getenv('TRENDING_HALF_LIFE', 7 * 24 * 3600))  # 热门分数衰减半衰期（秒）
+    TRENDING_REFRESH_INTERVAL = int(os.getenv('TRENDING_REFRESH_INTERVAL', 30))  # 热门索引累加新事件的间隔（秒）
+    TRENDING_REBUILD_INTERVAL = int(os.getenv('TRENDING_REBUILD_INTERVAL', 24 * 3600))  # 热门索引移动纪元（所有分数按衰减因子整体缩放）的间隔（秒）
+    TRENDING_MIRROR_SIZE = int(os.getenv('TRENDING_MIRROR_SIZE', 500))  # 热门索引进程内镜像保留的条数
+    TRENDING_TYPE_MIRROR_SIZE = int(os.getenv('TRENDING_TYPE_MIRROR_SIZE', 100))  # 每个类型（菜系/价格区间）热门列表在进程内保留的条数
+    TWEET_CATALOGUE_TTL = int(os.getenv('TWEET_CATALOGUE_TTL', 300))  # 推文类型目录刷新间隔（秒）
+    CB_TAG_WEIGHT = float(os.getenv('CB_TAG_WEIGHT', 1.0))  # 内容过滤中用户标签匹配分数的权重
+    TAG_INDEX_REFRESH_INTERVAL = int(os.getenv('TAG_INDEX_REFRESH_INTERVAL', 60))  # 标签索引增量加入新推文的间隔（秒）
+    TAG_INDEX_TTL = int(os.getenv('TAG_INDEX_TTL', 3600))  # 标签索引全量重建间隔（秒）
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))  # 内容过滤用户画像缓存最大用户数
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 300))  # 用户画像缓存最长有效期（秒）
+    ITEM_NEIGHBOR_COUNT = int(os.getenv('ITEM_NEIGHBOR_COUNT', 50))  # 物品协同过滤每个推文保留的近邻数
+    ITEM_RECENT_COUNT = int(os.getenv('ITEM_RECENT_COUNT', 20))  # 物品协同过滤使用的用户近期交互数
+    ITEM_INDEX_BATCH_SIZE = int(os.getenv('ITEM_INDEX_BATCH_SIZE', 256))  # 近邻计算/写入的批大小
+    ITEM_INDEX_SHARD_SIZE = int(os.getenv('ITEM_INDEX_SHARD_SIZE', 2000))  # 每次增量刷新额外轮流重算的推文数（全部推文每 推文数/该值 次刷新重算一遍）
+    SEEN_FILTER_BITS = int(os.getenv('SEEN_FILTER_BITS', 16384))  # 每个用户已看推文布隆过滤器的位数（Redis中占 BITS/8 字节，修改后需清除 seen:* 键）
+    SEEN_FILTER_HASHES = int(os.getenv('SEEN_FILTER_HASHES', 5))  # 布隆过滤器每个推文置位的哈希数
+    SEEN_FILTER_MAX_FILL = float(os.getenv('SEEN_FILTER_MAX_FILL', 0.5))  # 置位比例超过该值时重置为只含交互记录（控制误判率）
+    SEEN_FILTER_TTL = int(os.getenv('SEEN_FILTER_TTL', 7 * 24 * 3600))  # 已看集合的过期时间（秒，每次写入时续期）
+    SEEN_FILTER_LOCAL_SIZE = int(os.getenv('SEEN_FILTER_LOCAL_SIZE', 10000))  # 无Redis时进程内保存的用户数
+    SEEN_FILTER_WORKERS = int(os.getenv('SEEN_FILTER_WORKERS', 2))  # 后台写入曝光的线程数（与混合推荐线程池分开）
     
     # 强化学习参数
     RL_LEARNING_RATE = float(os.getenv('RL_LEARNING_RATE', 0.1))  # 强化学习率
     RL_EXPLORATION_RATE = float(os.getenv('RL_EXPLORATION_RATE', 0.2))  # 探索率（尝试新类型）
+    FEEDBACK_CACHE_SIZE = int(os.getenv('FEEDBACK_CACHE_SIZE', 10000))  # 进程内用户反馈缓存最大条数
+    FEEDBACK_CACHE_TTL = int(os.getenv('FEEDBACK_CACHE_TTL', 60))  # 进程内用户反馈缓存过期时间（秒）
     RL_ENABLED = os.getenv('RL_ENABLED', 'true').lower() == 'true'  # 是否启用强化学习
+    FEEDBACK_FLUSH_INTERVAL = float(os.getenv('FEEDBACK_FLUSH_INTERVAL', 2))  # 反馈批量写入数据库的间隔（秒）
+    FEEDBACK_FLUSH_SIZE = int(os.getenv('FEEDBACK_FLUSH_SIZE', 500))  # 缓冲反馈达到该条数时立即写入
+    FEEDBACK_MAX_RETRIES = int(os.getenv('FEEDBACK_MAX_RETRIES', 5))  # 单条反馈写入失败的最多重试次数，超过后记录日志并丢弃
+    FEEDBACK_BUFFER_LIMIT = int(os.getenv('FEEDBACK_BUFFER_LIMIT', 20000))  # 反馈缓冲区最多条数，超过时丢弃最早的反馈
+    RL_POLICY = os.getenv('RL_POLICY', 'thompson')  # 排序策略：thompson（汤普森采样）/ static（按近100条反馈的类型权重）
+    RL_BANDIT_PRIOR_ALPHA = float(os.getenv('RL_BANDIT_PRIOR_ALPHA', 1.0))  # 汤普森采样Beta先验a（喜欢）
+    RL_BANDIT_PRIOR_BETA = float(os.getenv('RL_BANDIT_PRIOR_BETA', 1.0))  # 汤普森采样Beta先验b（不喜欢）
+    RL_BANDIT_TTL = int(os.getenv('RL_BANDIT_TTL', 7 * 24 * 3600))  # Redis中用户在线学习参数的过期时间（秒）
+    RL_BANDIT_WEIGHT = float(os.getenv('RL_BANDIT_WEIGHT', 0.3))  # 汤普森采样的类型喜欢概率相对位置先验（0~1）的权重
@@ -47,6 +47,19 @@ class Database:
             conn.commit()
             return result.rowcount
 
+    def execute_updates(self, statements):
+        """在一个事务中依次执行多条写语句（params 为列表时按 executemany 执行），返回影响的总行数"""
+        with self.engine.connect() as conn:
+            try:
+                rowcount = 0
+                for query, params in statements:
+                    rowcount += conn.execute(text(query), params or {}).rowcount
+                conn.commit()
+                return rowcount
+            except Exception:
+                conn.rollback()
+                raise
+
 
 db = Database()
 
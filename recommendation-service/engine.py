@@ -1,15 +1,21 @@
 """
-推荐引擎（协同过滤 + 内容过滤 + 混合推荐）
+推荐引擎（协同过滤 + 物品协同过滤 + 内容过滤 + 混合推荐）
 """
 import json
 import logging
-from typing import List, Optional, Dict, Set
-from collections import defaultdict
-import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import List, Optional, Dict, Set, Tuple
+from collections import defaultdict, OrderedDict
 
 import pandas as pd
 import numpy as np
 import redis
+from scipy import sparse
 
 from config import Config
 from database import db
@@ -17,15 +23,260 @@ from database import db
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
+# 支持的推荐方法（推荐缓存键为 recommendations:{user_id}:{method}，清除用户缓存时逐个删除）
+RECOMMENDATION_METHODS = ('collaborative', 'cf', 'item', 'itemcf', 'content', 'cb', 'hybrid', 'popular')
 
-class CollaborativeFilteringRecommender:
-    """协同过滤推荐算法（基于用户行为相似度）"""
+# 释放Redis锁：只删除自己持有的锁（锁已过期被其他进程重新获取时不删除）
+RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+"""
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回分数最高的k个下标（argpartition选取后按分数降序排列）"""
+    if k <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        candidates = np.sort(np.argpartition(-scores, k - 1)[:k])
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def parse_type_cids(value) -> List[str]:
+    """解析多标签类型ID（tweets_type_cid 为逗号分隔字符串，如 "10,42"）"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return []
+    return [label.strip() for label in str(value).split(',') if label.strip()]
+
+
+def fixed_batches(values: List[int], size: int):
+    """把ID列表切成固定长度的批（最后一批用末尾ID补齐），每批SQL的占位符个数相同"""
+    size = max(1, size)
+    for start in range(0, len(values), size):
+        batch = list(values[start:start + size])
+        yield batch + [batch[-1]] * (size - len(batch))
+
+
+def in_params(prefix: str, values: List[int]) -> Tuple[str, Dict[str, int]]:
+    """IN (...) 的命名占位符和参数"""
+    placeholders = ','.join(f':{prefix}{i}' for i in range(len(values)))
+    return placeholders, {f'{prefix}{i}': value for i, value in enumerate(values)}
+
+
+def split_type_weights(type_weights: Dict[Optional[str], float]) -> Dict[str, float]:
+    """将按原始 tweets_type_cid 统计的权重展开为按单个类型ID的权重"""
+    label_weights = defaultdict(float)
+    for type_cid, weight in type_weights.items():
+        for label in parse_type_cids(type_cid):
+            label_weights[label] += weight
+    return dict(label_weights)
+
+
+class TypeIndex:
+    """推文多标签类型索引（推文下标 x 类型ID 的稀疏矩阵），类型匹配分数为稀疏矩阵与偏好向量的点积"""
+
+    def __init__(self, type_cids):
+        rows, labels = [], []
+        for idx, type_cid in enumerate(type_cids):
+            for label in parse_type_cids(type_cid):
+                rows.append(idx)
+                labels.append(label)
+        self.labels = sorted(set(labels))
+        self.vocab = {label: code for code, label in enumerate(self.labels)}
+        cols = [self.vocab[label] for label in labels]
+
+        # 每行按标签数归一化：多标签推文的匹配分数为各标签偏好的平均值
+        label_counts = np.bincount(np.array(rows, dtype=np.int64), minlength=len(type_cids))
+        values = 1.0 / label_counts[rows] if rows else []
+        self.matrix = sparse.csr_matrix((values, (rows, cols)), shape=(len(type_cids), len(self.labels)))
+
+    def preference_vector(self, label_weights: Dict[str, float]) -> np.ndarray:
+        vector = np.zeros(len(self.labels), dtype=np.float64)
+        for label, weight in label_weights.items():
+            if label in self.vocab:
+                vector[self.vocab[label]] = weight
+        return vector
+
+    def scores(self, label_weights: Dict[str, float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """每个推文的类型匹配分数（各标签权重的平均值），rows 指定时只计算这些下标"""
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        return matrix @ self.preference_vector(label_weights)
+
+
+class LocalCache:
+    """进程内LRU缓存（容量上限 + 按键过期时间，线程安全）"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        """写入缓存，过期时间取 ttl 与本地TTL中较短者"""
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+class UserItemMatrix:
+    """稀疏用户-物品矩阵（CSR存储 + 用户/物品ID与行列下标的映射）"""
+
+    def __init__(self, matrix: sparse.csr_matrix, user_ids: np.ndarray, item_ids: np.ndarray,
+                 user_index: Optional[Dict[int, int]] = None, item_index: Optional[Dict[int, int]] = None,
+                 norms: Optional[np.ndarray] = None):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.user_index = user_index if user_index is not None else {int(user_id): idx for idx, user_id in enumerate(user_ids)}
+        self.item_index = item_index if item_index is not None else {int(item_id): idx for idx, item_id in enumerate(item_ids)}
+        self.norms = norms if norms is not None else self.row_norms(matrix)
+        self._normalized = None
+
+    @staticmethod
+    def row_norms(matrix: sparse.csr_matrix) -> np.ndarray:
+        return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+
+    @classmethod
+    def from_records(cls, df: pd.DataFrame) -> 'UserItemMatrix':
+        """由 (user_id, item_id, rating) 记录构建矩阵，重复记录的评分累加"""
+        if df.empty:
+            return cls(sparse.csr_matrix((0, 0), dtype=np.float32),
+                       np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+        user_ids, user_codes = np.unique(df['user_id'].to_numpy(dtype=np.int64), return_inverse=True)
+        item_ids, item_codes = np.unique(df['item_id'].to_numpy(dtype=np.int64), return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (df['rating'].to_numpy(dtype=np.float32), (user_codes, item_codes)),
+            shape=(len(user_ids), len(item_ids))
+        )
+        matrix.sum_duplicates()
+        return cls(matrix, user_ids, item_ids)
+
+    def with_records(self, df: pd.DataFrame) -> 'UserItemMatrix':
+        """合并增量交互记录并返回新矩阵（新用户/物品追加在末尾，只重算受影响用户的范数）"""
+        if df.empty:
+            return self
+
+        user_index = dict(self.user_index)
+        item_index = dict(self.item_index)
+        new_users = [user_id for user_id in pd.unique(df['user_id'].astype('int64')) if int(user_id) not in user_index]
+        new_items = [item_id for item_id in pd.unique(df['item_id'].astype('int64')) if int(item_id) not in item_index]
+        for user_id in new_users:
+            user_index[int(user_id)] = len(user_index)
+        for item_id in new_items:
+            item_index[int(item_id)] = len(item_index)
+        user_ids = np.concatenate([self.user_ids, np.array(new_users, dtype=np.int64)])
+        item_ids = np.concatenate([self.item_ids, np.array(new_items, dtype=np.int64)])
+
+        rows = df['user_id'].astype('int64').map(user_index).to_numpy()
+        cols = df['item_id'].astype('int64').map(item_index).to_numpy()
+        shape = (len(user_ids), len(item_ids))
+        delta = sparse.csr_matrix((df['rating'].to_numpy(dtype=np.float32), (rows, cols)), shape=shape)
+
+        matrix = self.matrix.copy()
+        matrix.resize(shape)
+        matrix = (matrix + delta).tocsr()
+
+        norms = np.concatenate([self.norms, np.zeros(len(new_users), dtype=self.norms.dtype)])
+        affected = np.unique(rows)
+        norms[affected] = self.row_norms(matrix[affected])
+        return UserItemMatrix(matrix, user_ids, item_ids, user_index, item_index, norms)
+
+    @property
+    def empty(self) -> bool:
+        return self.matrix.nnz == 0
+
+    def __contains__(self, user_id) -> bool:
+        return int(user_id) in self.user_index
+
+    def user_row(self, user_id: int) -> sparse.csr_matrix:
+        """获取用户的行向量（1 x 物品数）"""
+        return self.matrix[self.user_index[int(user_id)]]
+
+    def normalized(self) -> sparse.csr_matrix:
+        """按行L2归一化后的矩阵（首次使用时计算并缓存）"""
+        if self._normalized is None:
+            inv_norms = np.divide(1.0, self.norms, out=np.zeros_like(self.norms), where=self.norms > 0)
+            self._normalized = sparse.csr_matrix(sparse.diags(inv_norms.astype(np.float32)) @ self.matrix)
+        return self._normalized
+
+
+class InteractionSnapshot:
+    """进程内共享的用户-物品矩阵快照（TTL过期时全量重建，tweets_records 新增时按水位线增量合并，并发请求只触发一次重建）"""
 
     def __init__(self):
-        self.similarity_threshold = Config.SIMILARITY_THRESHOLD
+        self.ttl = Config.MATRIX_SNAPSHOT_TTL
+        self.staleness = Config.MATRIX_STALENESS
+        self._matrix = None
+        self._signature = None
+        self._last_record_id = 0
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._record_listeners = []
+
+    def add_listener(self, callback):
+        """注册数据变化回调：增量合并时传入受影响的用户ID集合，全量重建时传入None"""
+        self._listeners.append(callback)
+
+    def add_record_listener(self, callback):
+        """注册新记录回调：按水位线加载到新交互记录时传入这些记录（user_id, item_id, rating）"""
+        self._record_listeners.append(callback)
 
-    def load_user_item_matrix(self) -> pd.DataFrame:
-        """加载用户-物品矩阵"""
+    def notify(self, user_ids: Optional[Set[int]]):
+        for callback in self._listeners:
+            try:
+                callback(user_ids)
+            except Exception as e:
+                logger.error("快照变化回调失败: %s", str(e), exc_info=True)
+
+    def notify_records(self, delta: pd.DataFrame):
+        for callback in self._record_listeners:
+            try:
+                callback(delta)
+            except Exception as e:
+                logger.error("新记录回调失败: %s", str(e), exc_info=True)
+
+    def load_records(self, after_id: int, upto_id: int) -> pd.DataFrame:
+        """加载ID在 (after_id, upto_id] 区间内的交互记录"""
         query = """
             SELECT 
                 tr.client_user_id as user_id,
@@ -38,15 +289,233 @@ class CollaborativeFilteringRecommender:
                 END as rating
             FROM tweets_records tr
             WHERE tr.type IN ('like', 'collect', 'browse')
+              AND tr.id > :after_id AND tr.id <= :upto_id
         """
-        df = db.execute_query(query)
-        if df.empty:
-            return pd.DataFrame()
-        
-        # 创建用户-物品矩阵
-        matrix = df.groupby(['user_id', 'item_id'])['rating'].sum().reset_index()
-        user_item_matrix = matrix.pivot(index='user_id', columns='item_id', values='rating').fillna(0)
-        return user_item_matrix
+        return db.execute_query(query, {'after_id': after_id, 'upto_id': upto_id})
+
+    def load_signature(self) -> Tuple[int, int]:
+        """获取 tweets_records 的 (行数, 最大ID)，用于检测数据变化"""
+        query = """
+            SELECT COUNT(*) as row_count, MAX(id) as max_id
+            FROM tweets_records
+            WHERE type IN ('like', 'collect', 'browse')
+        """
+        result = db.execute_query(query)
+        if result.empty:
+            return 0, 0
+        row = result.iloc[0]
+        return int(row['row_count']), int(row['max_id']) if pd.notna(row['max_id']) else 0
+
+    def is_fresh(self, now: float) -> bool:
+        return (self._matrix is not None
+                and now - self._checked_at < self.staleness
+                and now - self._built_at < self.ttl)
+
+    def get(self, check: bool = False) -> UserItemMatrix:
+        """获取矩阵快照，必要时检测变化并重建（check=True 时忽略陈旧时间，立即检测数据变化）"""
+        if not check and self.is_fresh(time.monotonic()):
+            return self._matrix
+
+        # 已有快照时不等待：其他线程正在重建则直接使用旧快照
+        if not self._lock.acquire(blocking=check or self._matrix is None):
+            return self._matrix
+        try:
+            now = time.monotonic()
+            if not check and self.is_fresh(now):
+                return self._matrix
+
+            signature = self.load_signature()
+            if self._matrix is None or now - self._built_at >= self.ttl:
+                self.rebuild(signature, now)
+            elif signature != self._signature:
+                self.apply_delta(signature, now)
+            self._checked_at = now
+            return self._matrix
+        finally:
+            self._lock.release()
+
+    def rebuild(self, signature: Tuple[int, int], now: float):
+        """全量加载水位线以内的交互记录"""
+        _, max_id = signature
+        self._matrix = UserItemMatrix.from_records(self.load_records(0, max_id))
+        self._signature = signature
+        self._last_record_id = max_id
+        self._built_at = now
+        self.notify(None)
+
+    def apply_delta(self, signature: Tuple[int, int], now: float):
+        """只加载上次水位线之后的新记录；行数对不上（有删除或修改）时回退为全量重建"""
+        row_count, max_id = signature
+        delta = self.load_records(self._last_record_id, max_id) if max_id > self._last_record_id else pd.DataFrame()
+        if row_count - self._signature[0] != len(delta):
+            self.rebuild(signature, now)
+        else:
+            self._matrix = self._matrix.with_records(delta)
+            self._signature = signature
+            self._last_record_id = max_id
+            if not delta.empty:
+                self.notify(set(int(user_id) for user_id in delta['user_id'].unique()))
+        if not delta.empty:
+            self.notify_records(delta)
+
+    def pin(self):
+        """固定当前快照，不再检测变化（用于fork出的只读子进程共享父进程矩阵）"""
+        self.ttl = float('inf')
+        self.staleness = float('inf')
+
+
+interaction_snapshot = InteractionSnapshot()
+
+
+class SeenFilter:
+    """用户已看推文集合（Redis位图实现的布隆过滤器）：交互和曝光时置位，候选过滤时一次GET取回位图在进程内判断，不再查询 tweets_records"""
+    KEY_PREFIX = 'seen:'
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+        self.size = Config.SEEN_FILTER_BITS
+        self.hashes = Config.SEEN_FILTER_HASHES
+        self.max_fill = Config.SEEN_FILTER_MAX_FILL
+        self.ttl = Config.SEEN_FILTER_TTL
+        # 无Redis时退化为进程内位图
+        self.local_cache = LocalCache(Config.SEEN_FILTER_LOCAL_SIZE, self.ttl)
+        interaction_snapshot.add_record_listener(self.on_records)
+
+    def key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    def positions(self, item_ids) -> np.ndarray:
+        """每个推文ID对应的 k 个位偏移（双重哈希 h1 + i*h2），形状为 (推文数, k)"""
+        ids = np.asarray(item_ids, dtype=np.int64).astype(np.uint64)
+        h1 = (ids * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+        h2 = ((ids * np.uint64(0xC2B2AE3D27D4EB4F)) >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return ((h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.size)).astype(np.int64)
+
+    def contains(self, bits: np.ndarray, item_ids) -> np.ndarray:
+        """判断推文是否在已看集合中（布尔数组，可能有少量误判为已看，不会漏判）"""
+        if len(item_ids) == 0:
+            return np.zeros(0, dtype=bool)
+        return bits[self.positions(item_ids)].all(axis=1)
+
+    def decode(self, value) -> np.ndarray:
+        """Redis位图 → 布尔数组（SETBIT 的偏移0是首字节最高位，与 unpackbits 默认顺序一致）"""
+        bits = np.zeros(self.size, dtype=bool)
+        unpacked = np.unpackbits(np.frombuffer(value, dtype=np.uint8))[:self.size]
+        bits[:len(unpacked)] = unpacked.astype(bool)
+        return bits
+
+    def from_interactions(self, user_id: int) -> np.ndarray:
+        """用交互快照中该用户的推文构建位图（快照在进程内常驻，不查询数据库）"""
+        bits = np.zeros(self.size, dtype=bool)
+        user_item_matrix = interaction_snapshot.get()
+        if user_id in user_item_matrix:
+            item_ids = user_item_matrix.item_ids[user_item_matrix.user_row(user_id).indices]
+            bits[self.positions(item_ids).ravel()] = True
+        return bits
+
+    def bootstrap(self, user_id: int) -> np.ndarray:
+        """位图不存在（新用户、已过期或饱和被重置）时从交互记录重建并写回"""
+        bits = self.from_interactions(user_id)
+        if self.redis_client is None:
+            self.local_cache.set(self.key(user_id), bits)
+            return bits
+        # 只在键不存在时写入：并发的 add 会先完成重建，此时直接读取已有位图
+        if not self.redis_client.set(self.key(user_id), np.packbits(bits).tobytes(), ex=self.ttl, nx=True):
+            value = self.redis_client.get(self.key(user_id))
+            if value is not None:
+                bits |= self.decode(value)
+        return bits
+
+    def load(self, user_ids: List[int]) -> Dict[int, np.ndarray]:
+        """批量取回用户位图（一次MGET）；不存在或置位比例过高的位图从交互记录重建"""
+        if self.redis_client is None:
+            values = [self.local_cache.get(self.key(user_id)) for user_id in user_ids]
+        else:
+            values = [None if value is None else self.decode(value)
+                      for value in self.redis_client.mget([self.key(user_id) for user_id in user_ids])]
+        result = {}
+        for user_id, bits in zip(user_ids, values):
+            if bits is not None and bits.mean() > self.max_fill:
+                self.delete(user_id)
+                bits = None
+            result[user_id] = bits if bits is not None else self.bootstrap(user_id)
+        return result
+
+    def user_bits(self, user_id: int) -> np.ndarray:
+        """单个用户的位图（读取失败时只按交互快照构建）"""
+        try:
+            return self.load([user_id])[user_id]
+        except Exception as e:
+            logger.error("读取已看集合失败: %s", str(e))
+            return self.from_interactions(user_id)
+
+    def mask(self, user_id: int, item_ids) -> np.ndarray:
+        """候选推文中已看过的部分"""
+        return self.contains(self.user_bits(user_id), item_ids)
+
+    def add(self, user_id: int, item_ids: List[int]):
+        """把推文加入用户已看集合（曝光或交互），并续期"""
+        if not item_ids:
+            return
+        try:
+            positions = self.positions(item_ids).ravel()
+            if self.redis_client is None:
+                bits = self.local_cache.get(self.key(user_id))
+                if bits is None:
+                    bits = self.bootstrap(user_id)
+                bits[positions] = True
+                self.local_cache.set(self.key(user_id), bits)
+                return
+            key = self.key(user_id)
+            if not self.redis_client.exists(key):
+                self.bootstrap(user_id)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for position in np.unique(positions).tolist():
+                pipe.setbit(key, position, 1)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error("写入已看集合失败: %s", str(e))
+
+    def on_records(self, delta: pd.DataFrame):
+        """tweets_records 新增交互时置位；位图还不存在的用户跳过（下次读取时从快照重建，已包含这些记录）"""
+        items_by_user = {int(user_id): group['item_id'].astype(np.int64).to_numpy()
+                         for user_id, group in delta.groupby('user_id')}
+        if self.redis_client is None:
+            for user_id, item_ids in items_by_user.items():
+                bits = self.local_cache.get(self.key(user_id))
+                if bits is not None:
+                    bits[self.positions(item_ids).ravel()] = True
+            return
+        user_ids = list(items_by_user.keys())
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.exists(self.key(user_id))
+        existing = [user_id for user_id, exists in zip(user_ids, pipe.execute()) if exists]
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in existing:
+            for position in np.unique(self.positions(items_by_user[user_id])).tolist():
+                pipe.setbit(self.key(user_id), position, 1)
+        pipe.execute()
+
+    def delete(self, user_id: int):
+        if self.redis_client is None:
+            self.local_cache.delete(self.key(user_id))
+        else:
+            self.redis_client.delete(self.key(user_id))
+
+
+class CollaborativeFilteringRecommender:
+    """协同过滤推荐算法（基于用户行为相似度）"""
+
+    def __init__(self, seen_filter: Optional[SeenFilter] = None):
+        self.similarity_threshold = Config.SIMILARITY_THRESHOLD
+        self.seen_filter = seen_filter or SeenFilter()
+
+    def load_user_item_matrix(self) -> UserItemMatrix:
+        """加载用户-物品矩阵（使用进程内共享快照）"""
+        return interaction_snapshot.get()
 
     def cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """计算余弦相似度"""
@@ -57,117 +526,302 @@ class CollaborativeFilteringRecommender:
             return 0.0
         return dot_product / (norm1 * norm2)
 
-    def find_similar_users(self, user_id: int, user_item_matrix: pd.DataFrame, top_k: int = 20) -> List[int]:
+    def compute_similar_users(self, user_id: int, user_item_matrix: UserItemMatrix,
+                              top_k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """一次矩阵-向量乘法计算目标用户与所有用户的相似度，返回top_k相似用户的行下标和相似度"""
+        empty = (np.array([], dtype=np.int64), np.array([], dtype=np.float32))
+        if user_id not in user_item_matrix:
+            return empty
+        
+        user_idx = user_item_matrix.user_index[user_id]
+        normalized = user_item_matrix.normalized()
+        similarities = (normalized @ normalized[user_idx].T).toarray().ravel()
+        similarities[user_idx] = 0.0
+        
+        # 阈值过滤后再取top_k
+        candidates = np.flatnonzero(similarities > self.similarity_threshold)
+        if len(candidates) == 0:
+            return empty
+        order = top_k_indices(similarities[candidates], top_k)
+        return candidates[order], similarities[candidates[order]]
+
+    def find_similar_users(self, user_id: int, user_item_matrix: UserItemMatrix, top_k: int = 20) -> List[int]:
         """找到相似用户"""
-        if user_id not in user_item_matrix.index:
+        similar_idx, _ = self.compute_similar_users(user_id, user_item_matrix, top_k)
+        return [int(user_item_matrix.user_ids[idx]) for idx in similar_idx]
+
+    def get_recommendations(self, user_id: int, top_n: int = 20) -> List[int]:
+        """基于协同过滤生成推荐（失败时抛出异常，由调用方区分“没有候选”和“计算失败”）"""
+        user_item_matrix = self.load_user_item_matrix()
+        if user_item_matrix.empty or user_id not in user_item_matrix:
             return []
         
-        user_vector = user_item_matrix.loc[user_id].values
-        similarities = []
+        # 找到相似用户（相似度直接复用于物品打分）
+        similar_idx, similarities = self.compute_similar_users(user_id, user_item_matrix)
+        if len(similar_idx) == 0:
+            return []
         
-        for other_user_id in user_item_matrix.index:
-            if other_user_id == user_id:
-                continue
-            other_vector = user_item_matrix.loc[other_user_id].values
-            similarity = self.cosine_similarity(user_vector, other_vector)
-            if similarity > self.similarity_threshold:
-                similarities.append((other_user_id, similarity))
+        # 物品分数 = 相似度加权的相似用户评分之和
+        item_scores = user_item_matrix.matrix[similar_idx].T @ similarities
         
-        # 按相似度排序，返回top_k个用户
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return [uid for uid, _ in similarities[:top_k]]
+        # 排除当前用户已交互的物品，以及已曝光过的物品
+        item_scores[user_item_matrix.user_row(user_id).indices] = 0.0
+        candidates = np.flatnonzero(item_scores > 0)
+        candidates = candidates[~self.seen_filter.mask(user_id, user_item_matrix.item_ids[candidates])]
+        
+        # 按分数排序，返回top_n
+        order = top_k_indices(item_scores[candidates], top_n)
+        return [int(item_id) for item_id in user_item_matrix.item_ids[candidates[order]]]
 
-    def get_recommendations(self, user_id: int, top_n: int = 20) -> List[int]:
-        """基于协同过滤生成推荐"""
-        try:
-            user_item_matrix = self.load_user_item_matrix()
-            if user_item_matrix.empty or user_id not in user_item_matrix.index:
-                return []
-            
-            # 找到相似用户
-            similar_users = self.find_similar_users(user_id, user_item_matrix)
-            if not similar_users:
-                return []
-            
-            # 获取当前用户已交互的物品
-            user_items = set(user_item_matrix.columns[user_item_matrix.loc[user_id] > 0])
-            
-            # 计算推荐分数
-            item_scores = defaultdict(float)
-            user_vector = user_item_matrix.loc[user_id].values
+    def get_batch_recommendations(self, user_ids: List[int], top_n: int = 20, top_k: int = 20) -> Dict[int, List[int]]:
+        """批量协同过滤推荐：共享一次矩阵加载，按块做用户x用户相似度矩阵乘法（失败时抛出异常）"""
+        results = {user_id: [] for user_id in user_ids}
+        user_item_matrix = self.load_user_item_matrix()
+        known_users = [user_id for user_id in user_ids if user_id in user_item_matrix]
+        if user_item_matrix.empty or not known_users:
+            return results
+        
+        normalized = user_item_matrix.normalized()
+        for start in range(0, len(known_users), Config.BATCH_BLOCK_SIZE):
+            block_users = known_users[start:start + Config.BATCH_BLOCK_SIZE]
+            rows = np.array([user_item_matrix.user_index[user_id] for user_id in block_users])
+            seen_bits = self.seen_filter.load(block_users)
             
-            for similar_user_id in similar_users:
-                similarity = self.cosine_similarity(
-                    user_vector,
-                    user_item_matrix.loc[similar_user_id].values
-                )
-                similar_user_items = user_item_matrix.loc[similar_user_id]
-                
-                # 推荐相似用户喜欢但当前用户未交互的物品
-                for item_id in similar_user_items.index:
-                    if item_id not in user_items and similar_user_items[item_id] > 0:
-                        item_scores[item_id] += similarity * similar_user_items[item_id]
+            # 块内所有用户与全部用户的相似度（块大小 x 用户数）
+            similarities = (normalized[rows] @ normalized.T).toarray()
+            similarities[np.arange(len(rows)), rows] = 0.0
             
-            # 按分数排序，返回top_n
-            recommended_items = sorted(item_scores.items(), key=lambda x: x[1], reverse=True)
-            return [item_id for item_id, _ in recommended_items[:top_n]]
+            # 每个用户保留超过阈值的top_k相似用户，组成稀疏权重矩阵
+            weight_rows, weight_cols, weight_values = [], [], []
+            for block_idx, user_similarities in enumerate(similarities):
+                candidates = np.flatnonzero(user_similarities > self.similarity_threshold)
+                similar_idx = candidates[top_k_indices(user_similarities[candidates], top_k)]
+                weight_rows.extend([block_idx] * len(similar_idx))
+                weight_cols.extend(similar_idx.tolist())
+                weight_values.extend(user_similarities[similar_idx].tolist())
+            weights = sparse.csr_matrix((weight_values, (weight_rows, weight_cols)),
+                                        shape=(len(rows), len(user_item_matrix.user_ids)))
             
-        except Exception as e:
-            logger.error("协同过滤推荐失败: %s", str(e), exc_info=True)
-            return []
+            # 物品分数 = 相似度加权的相似用户评分之和（块大小 x 物品数，稀疏）
+            item_scores = (weights @ user_item_matrix.matrix).tocsr()
+            for block_idx, user_id in enumerate(block_users):
+                row_start, row_end = item_scores.indptr[block_idx], item_scores.indptr[block_idx + 1]
+                cols = item_scores.indices[row_start:row_end]
+                scores = item_scores.data[row_start:row_end]
+                keep = (scores > 0) & ~np.isin(cols, user_item_matrix.matrix[rows[block_idx]].indices)
+                keep &= ~self.seen_filter.contains(seen_bits[user_id], user_item_matrix.item_ids[cols])
+                cols, scores = cols[keep], scores[keep]
+                order = top_k_indices(scores, top_n)
+                results[user_id] = [int(item_id) for item_id in user_item_matrix.item_ids[cols[order]]]
+        return results
 
 
-class ContentBasedRecommender:
-    """内容过滤推荐算法（基于用户标签和推文类型）"""
+class ItemSimilarityIndex:
+    """物品-物品相似度索引（每个推文预计算top-K近邻，持久化到Redis哈希）"""
 
-    def __init__(self):
-        pass
+    NEIGHBORS_KEY = 'item_neighbors'
+    META_KEY = 'item_neighbors:meta'
+
+    def __init__(self, redis_client, matrix_loader):
+        self.redis_client = redis_client
+        self.matrix_loader = matrix_loader
+        self.neighbor_count = Config.ITEM_NEIGHBOR_COUNT
+        self.batch_size = Config.ITEM_INDEX_BATCH_SIZE
+        self.shard_size = Config.ITEM_INDEX_SHARD_SIZE
 
-    def load_user_tags(self, user_id: int) -> Set[str]:
-        """加载用户标签"""
+    def load_max_record_id(self) -> int:
+        """获取当前 tweets_records 的最大ID（作为刷新水位线）"""
+        result = db.execute_query("SELECT MAX(id) as max_id FROM tweets_records")
+        if result.empty or pd.isna(result.iloc[0]['max_id']):
+            return 0
+        return int(result.iloc[0]['max_id'])
+
+    def load_touched_items(self, last_record_id: int) -> List[int]:
+        """获取水位线之后有新交互的推文"""
         query = """
-            SELECT tags FROM client_user WHERE id = :user_id
+            SELECT DISTINCT tweets_id
+            FROM tweets_records
+            WHERE id > :last_id AND type IN ('like', 'collect', 'browse')
         """
-        result = db.execute_query(query, {'user_id': user_id})
-        if result.empty or result.iloc[0]['tags'] is None:
-            return set()
-        tags_str = result.iloc[0]['tags']
-        if isinstance(tags_str, str):
-            return set(tag.strip() for tag in tags_str.split(',') if tag.strip())
-        return set()
-
-    def load_user_preferred_types(self, user_id: int) -> Dict[str, float]:
-        """加载用户偏好的推文类型（基于历史行为）"""
+        result = db.execute_query(query, {'last_id': last_record_id})
+        if result.empty:
+            return []
+        return [int(item_id) for item_id in result['tweets_id'].tolist()]
+
+    def compute_neighbors(self, user_item_matrix: UserItemMatrix,
+                          item_ids: Optional[List[int]] = None) -> Dict[int, List[Tuple[int, float]]]:
+        """计算指定推文（默认全部）的top-K近邻，按批次做稀疏矩阵乘法"""
+        item_user = user_item_matrix.matrix.T.tocsr()
+        norms = np.sqrt(np.asarray(item_user.multiply(item_user).sum(axis=1)).ravel())
+        inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        normalized = sparse.csr_matrix(sparse.diags(inv_norms) @ item_user)
+        normalized_t = normalized.T.tocsr()
+
+        if item_ids is None:
+            targets = np.arange(len(user_item_matrix.item_ids))
+        else:
+            targets = np.array([user_item_matrix.item_index[item_id] for item_id in item_ids
+                                if item_id in user_item_matrix.item_index], dtype=np.int64)
+
+        neighbors = {}
+        for start in range(0, len(targets), self.batch_size):
+            block = targets[start:start + self.batch_size]
+            similarities = (normalized[block] @ normalized_t).tocsr()
+            for row, item_idx in enumerate(block):
+                row_start, row_end = similarities.indptr[row], similarities.indptr[row + 1]
+                cols = similarities.indices[row_start:row_end]
+                values = similarities.data[row_start:row_end]
+                keep = (cols != item_idx) & (values > 0)
+                cols, values = cols[keep], values[keep]
+                order = top_k_indices(values, self.neighbor_count)
+                neighbors[int(user_item_matrix.item_ids[item_idx])] = [
+                    (int(user_item_matrix.item_ids[col]), round(float(value), 6))
+                    for col, value in zip(cols[order], values[order])
+                ]
+        return neighbors
+
+    def save_neighbors(self, neighbors: Dict[int, List[Tuple[int, float]]], key: Optional[str] = None):
+        """批量写入近邻列表（pipeline分批HSET）"""
+        key = key or self.NEIGHBORS_KEY
+        items = list(neighbors.items())
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            pipe.hset(key, mapping={str(item_id): json.dumps(neighbor_list) for item_id, neighbor_list in chunk})
+        pipe.execute()
+
+    def build(self) -> int:
+        """全量重建索引（写入临时键后原子替换）"""
+        max_record_id = self.load_max_record_id()
+        user_item_matrix = self.matrix_loader()
+        neighbors = self.compute_neighbors(user_item_matrix)
+
+        tmp_key = f"{self.NEIGHBORS_KEY}:building"
+        self.redis_client.delete(tmp_key)
+        if neighbors:
+            self.save_neighbors(neighbors, tmp_key)
+            self.redis_client.rename(tmp_key, self.NEIGHBORS_KEY)
+        else:
+            self.redis_client.delete(self.NEIGHBORS_KEY)
+        self.redis_client.hset(self.META_KEY, mapping={'last_record_id': max_record_id})
+        return len(neighbors)
+
+    def refresh(self) -> int:
+        """增量刷新，返回更新的推文数
+
+        相似度是对称的：重新计算上次刷新后有新交互的推文，以及它们刷新前后的近邻（这些推文的列表里可能要加入或去掉新交互的推文）；
+        此外每次按游标轮流全量重算 ITEM_INDEX_SHARD_SIZE 个推文，覆盖其余间接受影响的列表，索引的陈旧程度有上限，不依赖定期全量重建。
+        """
+        meta = self.redis_client.hgetall(self.META_KEY)
+        last_record_id = meta.get(b'last_record_id')
+        if last_record_id is None or not self.redis_client.exists(self.NEIGHBORS_KEY):
+            return self.build()
+
+        max_record_id = self.load_max_record_id()
+        touched_items = self.load_touched_items(int(last_record_id))
+        user_item_matrix = self.matrix_loader()
+        neighbors = self.compute_neighbors(user_item_matrix, touched_items) if touched_items else {}
+
+        affected = set()
+        for neighbor_lists in (neighbors, self.get_neighbors(touched_items)):
+            for neighbor_list in neighbor_lists.values():
+                affected.update(int(neighbor_id) for neighbor_id, _ in neighbor_list)
+
+        # 按游标轮转的分片
+        cursor = int(meta.get(b'shard_cursor', 0))
+        item_count = len(user_item_matrix.item_ids)
+        if cursor >= item_count:
+            cursor = 0
+        shard = user_item_matrix.item_ids[cursor:cursor + self.shard_size]
+        affected.update(int(item_id) for item_id in shard)
+        next_cursor = cursor + len(shard) if cursor + len(shard) < item_count else 0
+
+        affected.difference_update(neighbors.keys())
+        if affected:
+            neighbors.update(self.compute_neighbors(user_item_matrix, sorted(affected)))
+        if neighbors:
+            self.save_neighbors(neighbors)
+        self.redis_client.hset(self.META_KEY, mapping={'last_record_id': max_record_id, 'shard_cursor': next_cursor})
+        return len(neighbors)
+
+    def get_neighbors(self, item_ids: List[int]) -> Dict[int, List[Tuple[int, float]]]:
+        """批量读取近邻列表（单次HMGET）"""
+        if not item_ids:
+            return {}
+        values = self.redis_client.hmget(self.NEIGHBORS_KEY, [str(item_id) for item_id in item_ids])
+        return {item_id: json.loads(value) for item_id, value in zip(item_ids, values) if value}
+
+
+class ItemBasedRecommender:
+    """基于物品的协同过滤（合并用户近期交互推文的预计算近邻列表）"""
+
+    def __init__(self, item_index: ItemSimilarityIndex, seen_filter: Optional[SeenFilter] = None):
+        self.item_index = item_index
+        self.seen_filter = seen_filter or SeenFilter()
+        self.recent_count = Config.ITEM_RECENT_COUNT
+
+    def load_user_items(self, user_id: int) -> pd.DataFrame:
+        """加载用户交互过的推文及评分（按最近交互时间降序）"""
         query = """
             SELECT 
-                t.tweets_type_cid,
-                COUNT(*) as count,
-                SUM(CASE WHEN tr.type = 'like' THEN 5 WHEN tr.type = 'collect' THEN 4 ELSE 1 END) as score
-            FROM tweets_records tr
-            LEFT JOIN tweets t ON tr.tweets_id = t.id
-            WHERE tr.client_user_id = :user_id
-            GROUP BY t.tweets_type_cid
+                tweets_id,
+                SUM(CASE 
+                    WHEN type = 'like' THEN 5
+                    WHEN type = 'collect' THEN 4
+                    WHEN type = 'browse' THEN 1
+                    ELSE 0
+                END) as rating,
+                MAX(create_time) as last_time
+            FROM tweets_records
+            WHERE client_user_id = :user_id AND type IN ('like', 'collect', 'browse')
+            GROUP BY tweets_id
+            ORDER BY last_time DESC
         """
-        result = db.execute_query(query, {'user_id': user_id})
-        if result.empty:
-            return {}
+        return db.execute_query(query, {'user_id': user_id})
+
+    def get_recommendations(self, user_id: int, top_n: int = 20) -> List[int]:
+        """基于物品近邻生成推荐（失败时抛出异常）"""
+        if not self.item_index.redis_client:
+            return []
+        
+        user_items = self.load_user_items(user_id)
+        if user_items.empty:
+            return []
+        
+        interacted_items = set(int(item_id) for item_id in user_items['tweets_id'].tolist())
+        recent = user_items.head(self.recent_count)
+        ratings = dict(zip((int(item_id) for item_id in recent['tweets_id']), recent['rating'].astype(float)))
         
-        type_scores = {}
-        total_score = result['score'].sum()
-        if total_score > 0:
-            for _, row in result.iterrows():
-                type_id = str(row['tweets_type_cid'])
-                type_scores[type_id] = row['score'] / total_score
-        return type_scores
-
-    def load_candidate_tweets(self, limit: int = 200) -> pd.DataFrame:
+        # 合并近邻列表：分数 = 交互评分 * 物品相似度
+        item_scores = defaultdict(float)
+        for item_id, neighbor_list in self.item_index.get_neighbors(list(ratings.keys())).items():
+            for neighbor_id, similarity in neighbor_list:
+                if neighbor_id not in interacted_items:
+                    item_scores[neighbor_id] += ratings[item_id] * similarity
+        
+        # 排除已曝光过的推文
+        candidate_ids = list(item_scores.keys())
+        seen = self.seen_filter.mask(user_id, candidate_ids)
+        recommended_items = sorted(((item_id, item_scores[item_id]) for item_id, is_seen in zip(candidate_ids, seen)
+                                    if not is_seen), key=lambda x: x[1], reverse=True)
+        return [item_id for item_id, _ in recommended_items[:top_n]]
+
+
+class CandidatePool:
+    """全局共享的候选推文池（按热度排序的前N条推文，定期刷新，所有内容过滤请求共用）"""
+
+    def __init__(self):
+        self.size = Config.CANDIDATE_POOL_SIZE
+        self.ttl = Config.CANDIDATE_POOL_TTL
+        self._candidates = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def load_candidate_tweets(self, limit: int) -> pd.DataFrame:
         """加载候选推文"""
         query = """
             SELECT 
                 id,
-                tweets_title,
-                tweets_describe,
-                tweets_type_cid,
                 like_num,
                 collect_num,
                 browse_num
@@ -178,64 +832,736 @@ class ContentBasedRecommender:
         """
         return db.execute_query(query, {'limit': limit})
 
+    def build(self, df: pd.DataFrame) -> Dict:
+        """转换为NumPy数组：推文ID、热度及其log1p（类型匹配使用推文目录中共享的类型索引）"""
+        if df.empty:
+            return {
+                'ids': np.array([], dtype=np.int64),
+                'popularity': np.array([], dtype=np.float64),
+                'log_popularity': np.array([], dtype=np.float64),
+            }
+        popularity = (df['like_num'].fillna(0).astype(float) * 3 +
+                      df['collect_num'].fillna(0).astype(float) * 2 +
+                      df['browse_num'].fillna(0).astype(float) * 1)
+        popularity = popularity.to_numpy(dtype=np.float64)
+        return {
+            'ids': df['id'].to_numpy(dtype=np.int64),
+            'popularity': popularity,
+            'log_popularity': np.log1p(popularity),
+        }
+
+    def get(self) -> Dict:
+        """获取候选池（按热度降序），过期时由一个线程刷新，其他线程继续使用旧数据"""
+        if self._candidates is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._candidates
+        if not self._lock.acquire(blocking=self._candidates is None):
+            return self._candidates
+        try:
+            if self._candidates is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._candidates = self.build(self.load_candidate_tweets(self.size))
+                self._loaded_at = time.monotonic()
+            return self._candidates
+        finally:
+            self._lock.release()
+
+
+candidate_pool = CandidatePool()
+
+
+class TweetCatalogue:
+    """全局共享的推文目录（所有有效推文的ID -> 多标签类型索引，定期刷新，供强化学习排序查找推文类型）"""
+
+    def __init__(self):
+        self.ttl = Config.TWEET_CATALOGUE_TTL
+        self._catalogue = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def load_tweets(self) -> pd.DataFrame:
+        """加载所有有效推文的类型（固定SQL，不随推荐列表变化）"""
+        query = """
+            SELECT id, tweets_type_cid
+            FROM tweets
+            WHERE status IS NULL OR status != '0'
+        """
+        return db.execute_query(query)
+
+    def load_type_names(self) -> Dict[str, str]:
+        """加载类型ID到类型名称的映射（菜系及价格区间41~45）"""
+        result = db.execute_query("SELECT id, name FROM tweets_type")
+        if result.empty:
+            return {}
+        return {str(type_id): str(name) for type_id, name in zip(result['id'], result['name']) if pd.notna(name)}
+
+    def build(self, df: pd.DataFrame, type_names: Dict[str, str]) -> Dict:
+        """推文ID到行下标的映射、多标签类型索引及类型名称"""
+        if df.empty:
+            return {'positions': {}, 'type_cids': [], 'type_index': TypeIndex([]), 'type_names': type_names}
+        ids = df['id'].to_numpy(dtype=np.int64)
+        type_cids = df['tweets_type_cid'].tolist()
+        return {
+            'positions': {int(item_id): idx for idx, item_id in enumerate(ids)},
+            'type_cids': type_cids,
+            'type_index': TypeIndex(type_cids),
+            'type_names': type_names,
+        }
+
+    def get(self) -> Dict:
+        """获取推文目录，过期时由一个线程刷新，其他线程继续使用旧数据"""
+        if self._catalogue is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._catalogue
+        if not self._lock.acquire(blocking=self._catalogue is None):
+            return self._catalogue
+        try:
+            if self._catalogue is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._catalogue = self.build(self.load_tweets(), self.load_type_names())
+                self._loaded_at = time.monotonic()
+            return self._catalogue
+        finally:
+            self._lock.release()
+
+    def type_cid(self, item_id: int):
+        """推文的类型ID字符串，目录中没有时返回None"""
+        catalogue = self.get()
+        position = catalogue['positions'].get(int(item_id))
+        return None if position is None else catalogue['type_cids'][position]
+
+    def type_scores(self, item_ids: List[int], label_weights: Dict[str, float],
+                    default: float = 0.0) -> np.ndarray:
+        """指定推文的类型匹配分数（各标签权重的平均值），目录中没有或没有类型的推文为 default"""
+        catalogue = self.get()
+        type_index = catalogue['type_index']
+        positions = np.array([catalogue['positions'].get(int(item_id), -1) for item_id in item_ids], dtype=np.int64)
+        scores = np.full(len(item_ids), default, dtype=np.float64)
+        valid = positions >= 0
+        if valid.any():
+            rows = positions[valid]
+            typed = type_index.matrix.indptr[rows + 1] > type_index.matrix.indptr[rows]
+            scores[np.flatnonzero(valid)[typed]] = type_index.scores(label_weights, rows[typed])
+        return scores
+
+
+tweet_catalogue = TweetCatalogue()
+
+
+class TagIndex:
+    """标签匹配索引（标签 -> 推文，带IDF权重），基于推文标题、描述和类型名称构建，新推文增量加入"""
+
+    def __init__(self):
+        self.refresh_interval = Config.TAG_INDEX_REFRESH_INTERVAL
+        self.ttl = Config.TAG_INDEX_TTL
+        self.tweet_ids = []
+        self.tweet_index = {}
+        self.texts = []
+        self.postings = {}
+        self.type_names = {}
+        self.last_tweet_id = 0
+        self._matrix = None
+        self._idf = None
+        self._tag_vocab = {}
+        # None 表示从未构建/检查过（time.monotonic() 从开机计时，不能用0表示）
+        self._built_at = None
+        self._checked_at = None
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+
+    def load_tweets(self, after_id: int) -> pd.DataFrame:
+        """加载ID大于 after_id 的推文文本"""
+        query = """
+            SELECT id, tweets_title, tweets_describe, tweets_type_cid
+            FROM tweets
+            WHERE id > :after_id AND (status IS NULL OR status != '0')
+            ORDER BY id
+        """
+        return db.execute_query(query, {'after_id': after_id})
+
+    def add_tweets(self, df: pd.DataFrame):
+        """追加推文文本，并把已有标签与新推文做匹配"""
+        if df.empty:
+            return
+        start = len(self.texts)
+        for row in df.itertuples(index=False):
+            parts = [row.tweets_title, row.tweets_describe]
+            parts.extend(self.type_names.get(label, '') for label in parse_type_cids(row.tweets_type_cid))
+            self.tweet_index[int(row.id)] = len(self.tweet_ids)
+            self.tweet_ids.append(int(row.id))
+            self.texts.append(' '.join(str(part) for part in parts if isinstance(part, str)).lower())
+            self.last_tweet_id = max(self.last_tweet_id, int(row.id))
+        for tag, tweet_indices in self.postings.items():
+            tweet_indices.extend(idx for idx in range(start, len(self.texts)) if tag in self.texts[idx])
+        self._matrix = None
+
+    def ensure_tags(self, tags: Set[str]):
+        """首次出现的标签扫描全部推文建立倒排表"""
+        for tag in tags:
+            if tag not in self.postings:
+                self.postings[tag] = [idx for idx, text in enumerate(self.texts) if tag in text]
+                self._matrix = None
+
+    def build_matrix(self):
+        """由倒排表构建 推文 x 标签 稀疏矩阵及IDF向量"""
+        self._tag_vocab = {tag: code for code, tag in enumerate(self.postings)}
+        rows, cols = [], []
+        for tag, tweet_indices in self.postings.items():
+            rows.extend(tweet_indices)
+            cols.extend([self._tag_vocab[tag]] * len(tweet_indices))
+        self._matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)),
+                                         shape=(len(self.tweet_ids), len(self._tag_vocab)))
+        document_freq = np.array([len(self.postings[tag]) for tag in self._tag_vocab], dtype=np.float64)
+        self._idf = np.log((1 + len(self.tweet_ids)) / (1 + document_freq))
+
+    def refresh(self):
+        """过期时全量重建，否则按推文ID水位线增量加入新推文；
+        由一个线程刷新，已有索引时其他线程不等待，继续使用旧索引（全量重建在锁外进行，完成后一次替换）"""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return
+            if self._built_at is None or now - self._built_at >= self.ttl:
+                with self._lock:
+                    tags = set(self.postings)
+                rebuilt = TagIndex()
+                rebuilt.type_names = tweet_catalogue.get()['type_names']
+                rebuilt.add_tweets(rebuilt.load_tweets(0))
+                rebuilt.ensure_tags(tags)
+                with self._lock:
+                    # 重建期间新出现的标签
+                    rebuilt.ensure_tags(set(self.postings) - tags)
+                    self.type_names = rebuilt.type_names
+                    self.tweet_ids, self.tweet_index = rebuilt.tweet_ids, rebuilt.tweet_index
+                    self.texts, self.postings = rebuilt.texts, rebuilt.postings
+                    self.last_tweet_id = rebuilt.last_tweet_id
+                    self._matrix = None
+                self._built_at = now
+            else:
+                df = self.load_tweets(self.last_tweet_id)
+                with self._lock:
+                    self.add_tweets(df)
+            self._checked_at = now
+        finally:
+            self._refresh_lock.release()
+
+    def affinity(self, tags: Set[str], item_ids: np.ndarray) -> np.ndarray:
+        """用户标签与指定推文的匹配分数（IDF加权稀疏向量积，归一化到0~1）"""
+        scores = np.zeros(len(item_ids), dtype=np.float64)
+        tags = set(tag.lower() for tag in tags if tag)
+        if not tags or len(item_ids) == 0:
+            return scores
+        self.refresh()
+        with self._lock:
+            self.ensure_tags(tags)
+            if self._matrix is None:
+                self.build_matrix()
+            user_vector = np.zeros(len(self._tag_vocab), dtype=np.float64)
+            for tag in tags:
+                user_vector[self._tag_vocab[tag]] = self._idf[self._tag_vocab[tag]]
+            total_weight = user_vector.sum()
+            if total_weight <= 0:
+                return scores
+            positions = np.array([self.tweet_index.get(int(item_id), -1) for item_id in item_ids], dtype=np.int64)
+            valid = positions >= 0
+            if valid.any():
+                scores[valid] = (self._matrix[positions[valid]] @ user_vector) / total_weight
+        return scores
+
+
+tag_index = TagIndex()
+
+
+class ContentBasedRecommender:
+    """内容过滤推荐算法（基于用户标签和推文类型）"""
+
+    def __init__(self, seen_filter: Optional[SeenFilter] = None):
+        self.profile_cache = LocalCache(Config.PROFILE_CACHE_SIZE, Config.PROFILE_CACHE_TTL)
+        self.seen_filter = seen_filter or SeenFilter()
+        interaction_snapshot.add_listener(self.on_interactions_changed)
+
+    def on_interactions_changed(self, user_ids: Optional[Set[int]]):
+        """tweets_records 有新记录时清除对应用户的画像缓存"""
+        if user_ids is None:
+            self.profile_cache.delete_prefix('')
+            return
+        for user_id in user_ids:
+            self.profile_cache.delete(str(user_id))
+
+    def load_user_profile(self, user_id: int) -> Dict:
+        """一次查询加载用户画像：标签、类型偏好（带进程内缓存；已交互推文由已看集合判断）"""
+        cached = self.profile_cache.get(str(user_id))
+        if cached is not None:
+            return cached
+
+        query = """
+            SELECT 'tag' as kind, cu.tags as value, NULL as score
+            FROM client_user cu
+            WHERE cu.id = :user_id
+            UNION ALL
+            SELECT 
+                'type' as kind,
+                t.tweets_type_cid as value,
+                SUM(CASE WHEN tr.type = 'like' THEN 5 WHEN tr.type = 'collect' THEN 4 ELSE 1 END) as score
+            FROM tweets_records tr
+            LEFT JOIN tweets t ON tr.tweets_id = t.id
+            WHERE tr.client_user_id = :user_id
+            GROUP BY t.tweets_type_cid
+        """
+        result = db.execute_query(query, {'user_id': user_id})
+
+        user_tags = set()
+        type_preferences = {}
+        if not result.empty:
+            tag_rows = result[result['kind'] == 'tag']
+            if not tag_rows.empty and isinstance(tag_rows.iloc[0]['value'], str):
+                user_tags = set(tag.strip() for tag in tag_rows.iloc[0]['value'].split(',') if tag.strip())
+
+            type_rows = result[result['kind'] == 'type']
+            total_score = type_rows['score'].astype(float).sum()
+            if total_score > 0:
+                # 按单个类型ID汇总（"10,42" 的行为同时计入类型10和42）
+                type_preferences = split_type_weights({
+                    type_cid: float(score) / total_score
+                    for type_cid, score in zip(type_rows['value'], type_rows['score'].astype(float))
+                })
+
+        profile = {
+            'tags': user_tags,
+            'type_preferences': type_preferences,
+        }
+        self.profile_cache.set(str(user_id), profile)
+        return profile
+
     def get_recommendations(self, user_id: int, top_n: int = 20) -> List[int]:
-        """基于内容过滤生成推荐"""
+        """基于内容过滤生成推荐（失败时抛出异常）"""
+        # 加载用户画像（标签、类型偏好）
+        profile = self.load_user_profile(user_id)
+        user_tags = profile['tags']
+        type_preferences = profile['type_preferences']
+        
+        # 从共享候选池中取热度最高的候选推文
+        candidates = candidate_pool.get()
+        limit = min(Config.CANDIDATE_POOL_SIZE, top_n * 10)
+        candidate_ids = candidates['ids'][:limit]
+        if len(candidate_ids) == 0:
+            return []
+        
+        # 分数 = 类型匹配分数 * 0.6 + 热度分数 * 0.4（类型匹配按推文目录的多标签类型索引计算）
+        type_scores = tweet_catalogue.type_scores(candidate_ids, type_preferences)
+        scores = type_scores * 0.6 + candidates['log_popularity'][:limit] * 0.4
+        
+        # 标签匹配分数（用户标签与推文标题/描述/类型名称的匹配，无行为的新用户也能个性化）
+        if user_tags:
+            scores = scores + tag_index.affinity(user_tags, candidate_ids) * Config.CB_TAG_WEIGHT
+        
+        # 排除已交互、已曝光的推文后取top_n
+        mask = ~self.seen_filter.mask(user_id, candidate_ids)
+        remaining = np.flatnonzero(mask)
+        order = top_k_indices(scores[remaining], top_n)
+        return candidate_ids[remaining[order]].tolist()
+
+
+class FeedbackWriter:
+    """推荐反馈写缓冲（接收后先进入内存，由后台线程定时批量写入 recommendation_feedback）
+
+    与后端原有逻辑一致，同一用户对同一推文的最新反馈覆盖旧反馈：
+    写入时先删除这些(用户, 推文)的旧记录，再多行INSERT，二者在同一事务中。
+    批量写入失败且数据库可连接时逐条写入，单条失败超过 FEEDBACK_MAX_RETRIES 次后记录日志并丢弃；
+    缓冲区最多 FEEDBACK_BUFFER_LIMIT 条，超过时丢弃最早的反馈。
+    """
+
+    DELETE_QUERY = "DELETE FROM recommendation_feedback WHERE (client_user_id, tweets_id) IN ({pairs})"
+    INSERT_QUERY = """
+        INSERT INTO recommendation_feedback (client_user_id, tweets_id, feedback, reward, create_time)
+        VALUES (:client_user_id, :tweets_id, :feedback, :reward, :create_time)
+    """
+
+    def __init__(self):
+        self.flush_interval = Config.FEEDBACK_FLUSH_INTERVAL
+        self.flush_size = Config.FEEDBACK_FLUSH_SIZE
+        self.max_retries = Config.FEEDBACK_MAX_RETRIES
+        self.buffer_limit = Config.FEEDBACK_BUFFER_LIMIT
+        self._pending = OrderedDict()
+        self._inflight = OrderedDict()
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, user_id: int, tweets_id: int, feedback: str, reward: int):
+        """加入一条反馈，缓冲区满时立即唤醒写入线程"""
+        with self._lock:
+            key = (user_id, tweets_id)
+            self._pending.pop(key, None)
+            self._pending[key] = {
+                'client_user_id': user_id,
+                'tweets_id': tweets_id,
+                'feedback': feedback,
+                'reward': reward,
+                'create_time': datetime.now(),
+            }
+            self._failures.pop(key, None)
+            self.trim()
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wakeup.set()
+
+    def pending_rows(self, user_id: int) -> List[Dict]:
+        """某用户尚未写入数据库的反馈（最新的在前，包括正在写入的）"""
+        with self._lock:
+            rows = [row for (pending_user, _), row in reversed(self._pending.items()) if pending_user == user_id]
+            rows.extend(row for key, row in reversed(self._inflight.items())
+                        if key[0] == user_id and key not in self._pending)
+            return rows
+
+    def previous_feedback(self, user_id: int, tweets_id: int) -> Optional[Dict]:
+        """同一用户对同一推文的上一条反馈（先查缓冲区，再查数据库）"""
+        with self._lock:
+            row = self._pending.get((user_id, tweets_id)) or self._inflight.get((user_id, tweets_id))
+        if row is not None:
+            return row
+        query = """
+            SELECT feedback, reward
+            FROM recommendation_feedback
+            WHERE client_user_id = :user_id AND tweets_id = :tweets_id
+            ORDER BY create_time DESC
+            LIMIT 1
+        """
+        result = db.execute_query(query, {'user_id': user_id, 'tweets_id': tweets_id})
+        return None if result.empty else result.iloc[0].to_dict()
+
+    def trim(self):
+        """缓冲区超过上限时丢弃最早的反馈（调用方持有 _lock）"""
+        while len(self._pending) > self.buffer_limit:
+            key, row = self._pending.popitem(last=False)
+            self._failures.pop(key, None)
+            logger.error("反馈缓冲区已满，丢弃反馈: %s", row)
+
+    def write(self, rows: List[Dict]):
+        """在一个事务中删除这些(用户, 推文)的旧记录并插入新反馈"""
+        pairs = ','.join(f"(:u{i}, :t{i})" for i in range(len(rows)))
+        params = {}
+        for i, row in enumerate(rows):
+            params[f'u{i}'] = row['client_user_id']
+            params[f't{i}'] = row['tweets_id']
+        db.execute_updates([
+            (self.DELETE_QUERY.format(pairs=pairs), params),
+            (self.INSERT_QUERY, rows),
+        ])
+
+    def write_each(self, rows: Dict) -> Tuple[int, Dict]:
+        """逐条写入，返回 (写入条数, 写入失败的反馈及异常)"""
+        written = 0
+        failed = OrderedDict()
+        for key, row in rows.items():
+            try:
+                self.write([row])
+                written += 1
+            except Exception as e:
+                failed[key] = (row, e)
+        return written, failed
+
+    def database_available(self) -> bool:
         try:
-            # 加载用户偏好
-            user_tags = self.load_user_tags(user_id)
-            type_preferences = self.load_user_preferred_types(user_id)
-            
-            # 加载用户已交互的推文
-            query = """
-                SELECT DISTINCT tweets_id FROM tweets_records 
-                WHERE client_user_id = :user_id
+            db.execute_query("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def flush(self) -> int:
+        """把缓冲区中的反馈批量写入数据库，返回写入条数
+
+        批量写入失败时：数据库不可连接则全部放回缓冲区等待下次重试（不计入失败次数）；
+        可以连接则逐条写入，把个别写不进去的反馈隔离出来，其余反馈照常落库。
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._inflight, self._pending = self._pending, OrderedDict()
+                rows = list(self._inflight.values())
+            if not rows:
+                return 0
+            retry = OrderedDict()
+            try:
+                self.write(rows)
+                written = len(rows)
+            except Exception as e:
+                logger.error("批量写入推荐反馈失败: %s", str(e))
+                if not self.database_available():
+                    written, retry = 0, self._inflight
+                else:
+                    written, failed = self.write_each(self._inflight)
+                    with self._lock:
+                        for key, (row, error) in failed.items():
+                            failures = self._failures.get(key, 0) + 1
+                            if failures >= self.max_retries:
+                                self._failures.pop(key, None)
+                                logger.error("推荐反馈写入失败%s次，丢弃: %s %s", failures, row, str(error))
+                            else:
+                                self._failures[key] = failures
+                                retry[key] = row
+            with self._lock:
+                for key in self._inflight:
+                    if key not in retry:
+                        self._failures.pop(key, None)
+                for key, row in reversed(retry.items()):
+                    # 写入失败期间又收到的更新反馈优先（失败次数重新计算）
+                    if key in self._pending:
+                        self._failures.pop(key, None)
+                    else:
+                        self._pending[key] = row
+                        self._pending.move_to_end(key, last=False)
+                self.trim()
+                self._inflight = OrderedDict()
+            return written
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        """启动后台写入线程（常驻服务启动时调用）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='feedback-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台写入线程并写入剩余反馈"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+feedback_writer = FeedbackWriter()
+
+
+class ThompsonSamplingBandit:
+    """按用户、按类型的Beta-伯努利汤普森采样（喜欢计入a，不喜欢计入b）
+
+    参数存放在Redis哈希 rl:bandit:{user_id}（字段 类型ID:a / 类型ID:b，_init 表示已从数据库初始化），
+    请求时只读取O(类型数)个数字；新反馈通过 observe 增量累加，
+    没有Redis时退化为进程内缓存。
+    """
+
+    KEY_PREFIX = 'rl:bandit:'
+    INIT_FIELD = '_init'
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+        self.prior_alpha = Config.RL_BANDIT_PRIOR_ALPHA
+        self.prior_beta = Config.RL_BANDIT_PRIOR_BETA
+        self.ttl = Config.RL_BANDIT_TTL
+        self.weight = Config.RL_BANDIT_WEIGHT
+        self.local_params = LocalCache(Config.FEEDBACK_CACHE_SIZE, Config.RL_BANDIT_TTL)
+        self.rng = np.random.default_rng()
+
+    @staticmethod
+    def credit(type_cid, feedback: str, weight: float = 1.0) -> Dict[str, float]:
+        """一条反馈对各类型参数的增量（多标签推文按标签数平分）"""
+        labels = parse_type_cids(type_cid)
+        if not labels or feedback not in ('like', 'dislike'):
+            return {}
+        suffix = 'a' if feedback == 'like' else 'b'
+        return {f"{label}:{suffix}": abs(weight) / len(labels) for label in labels}
+
+    def load_counts(self, user_id: int) -> Dict[str, float]:
+        """从数据库按类型和反馈分组汇总用户的全部反馈（只在Redis中没有该用户参数时执行）"""
+        return self.load_counts_many([user_id])[user_id]
+
+    def load_counts_many(self, user_ids: List[int]) -> Dict[int, Dict[str, float]]:
+        """一次分组查询汇总多个用户的反馈（ID按固定长度分批，每批一条SQL）；
+        缓冲区中还有反馈的用户逐条读取后合并缓冲区，由写入线程负责落库"""
+        counts = {user_id: defaultdict(float) for user_id in user_ids}
+        pending_by_user = {user_id: feedback_writer.pending_rows(user_id) for user_id in user_ids}
+        grouped_users = [user_id for user_id in user_ids if not pending_by_user[user_id]]
+        for batch in fixed_batches(grouped_users, Config.SQL_IN_BATCH_SIZE):
+            placeholders, params = in_params('uid', batch)
+            query = f"""
+                SELECT 
+                    rf.client_user_id,
+                    t.tweets_type_cid,
+                    rf.feedback,
+                    SUM(ABS(COALESCE(rf.reward, 1))) as weight
+                FROM recommendation_feedback rf
+                LEFT JOIN tweets t ON rf.tweets_id = t.id
+                WHERE rf.client_user_id IN ({placeholders})
+                GROUP BY rf.client_user_id, t.tweets_type_cid, rf.feedback
             """
-            interacted_items = set(db.execute_query(query, {'user_id': user_id})['tweets_id'].tolist())
-            
-            # 加载候选推文
-            candidates = self.load_candidate_tweets(limit=min(200, top_n * 10))
-            if candidates.empty:
-                return []
-            
-            # 计算推荐分数
-            item_scores = []
-            for _, tweet in candidates.iterrows():
-                item_id = tweet['id']
-                if item_id in interacted_items:
-                    continue
-                
-                score = 0.0
-                
-                # 类型匹配分数
-                type_cid = str(tweet['tweets_type_cid']) if pd.notna(tweet['tweets_type_cid']) else ''
-                if type_cid in type_preferences:
-                    score += type_preferences[type_cid] * 0.6
-                
-                # 热度分数（归一化）
-                popularity = (tweet['like_num'] * 3 + tweet['collect_num'] * 2 + tweet['browse_num'] * 1)
-                score += math.log1p(popularity) * 0.4
-                
-                item_scores.append((item_id, score))
-            
-            # 按分数排序，返回top_n
-            item_scores.sort(key=lambda x: x[1], reverse=True)
-            return [item_id for item_id, _ in item_scores[:top_n]]
-            
+            result = db.execute_query(query, params)
+            for user_id, type_cid, feedback, weight in zip(
+                    result.get('client_user_id', []), result.get('tweets_type_cid', []),
+                    result.get('feedback', []), result.get('weight', [])):
+                for field, value in self.credit(type_cid, feedback, float(weight)).items():
+                    counts[int(user_id)][field] += value
+        for user_id in user_ids:
+            if pending_by_user[user_id]:
+                for type_cid, feedback, weight in self.merged_rows(user_id, pending_by_user[user_id]):
+                    for field, value in self.credit(type_cid, feedback, weight).items():
+                        counts[user_id][field] += value
+        return {user_id: dict(user_counts) for user_id, user_counts in counts.items()}
+
+    def merged_rows(self, user_id: int, pending: List[Dict]) -> List[Tuple[object, str, float]]:
+        """用户的全部反馈 (类型, 反馈, 权重)：缓冲区中的反馈覆盖数据库中同一推文的旧反馈"""
+        query = """
+            SELECT 
+                rf.tweets_id,
+                t.tweets_type_cid,
+                rf.feedback,
+                ABS(COALESCE(rf.reward, 1)) as weight
+            FROM recommendation_feedback rf
+            LEFT JOIN tweets t ON rf.tweets_id = t.id
+            WHERE rf.client_user_id = :user_id
+        """
+        result = db.execute_query(query, {'user_id': user_id})
+        pending_items = set(row['tweets_id'] for row in pending)
+        rows = [(tweet_catalogue.type_cid(row['tweets_id']), row['feedback'], abs(float(row['reward'] or 1)))
+                for row in pending]
+        if not result.empty:
+            result = result[~result['tweets_id'].isin(pending_items)]
+            rows.extend(zip(result['tweets_type_cid'], result['feedback'], result['weight'].astype(float)))
+        return rows
+
+    def get_params(self, user_id: int) -> Dict[str, float]:
+        """读取用户的Beta参数计数，首次使用时从数据库初始化"""
+        return self.get_params_many([user_id])[user_id]
+
+    def get_params_many(self, user_ids: List[int]) -> Dict[int, Dict[str, float]]:
+        """批量读取用户的Beta参数计数（一次pipeline HGETALL），未初始化的用户一起从数据库初始化"""
+        params_by_user = {}
+        if self.redis_client is None:
+            for user_id in user_ids:
+                params = self.local_params.get(str(user_id))
+                if params is not None:
+                    params_by_user[user_id] = params
+            missing = [user_id for user_id in user_ids if user_id not in params_by_user]
+            if missing:
+                for user_id, params in self.load_counts_many(missing).items():
+                    self.local_params.set(str(user_id), params)
+                    params_by_user[user_id] = params
+            return params_by_user
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hgetall(f"{self.KEY_PREFIX}{user_id}")
+            for user_id, stored in zip(user_ids, pipe.execute()):
+                if stored.get(self.INIT_FIELD.encode()) is not None:
+                    params_by_user[user_id] = {field.decode(): float(value) for field, value in stored.items()
+                                               if field.decode() != self.INIT_FIELD}
         except Exception as e:
-            logger.error("内容过滤推荐失败: %s", str(e), exc_info=True)
-            return []
+            logger.error("读取强化学习参数失败: %s", str(e))
+            return self.load_counts_many(user_ids)
+
+        missing = [user_id for user_id in user_ids if user_id not in params_by_user]
+        if not missing:
+            return params_by_user
+        loaded = self.load_counts_many(missing)
+        try:
+            pipe = self.redis_client.pipeline()
+            for user_id, params in loaded.items():
+                key = f"{self.KEY_PREFIX}{user_id}"
+                pipe.delete(key)
+                pipe.hset(key, mapping={self.INIT_FIELD: 1, **params})
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error("写入强化学习参数失败: %s", str(e))
+        params_by_user.update(loaded)
+        return params_by_user
+
+    def observe(self, user_id: int, type_cid, feedback: str, weight: float = 1.0, sign: float = 1.0):
+        """增量累加一条反馈（sign=-1 用于撤销被覆盖的旧反馈）"""
+        increments = self.credit(type_cid, feedback, weight)
+        if not increments:
+            return
+        if self.redis_client is None:
+            params = self.local_params.get(str(user_id))
+            if params is not None:
+                params = dict(params)
+                for field, value in increments.items():
+                    params[field] = max(0.0, params.get(field, 0.0) + sign * value)
+                self.local_params.set(str(user_id), params)
+            return
+
+        key = f"{self.KEY_PREFIX}{user_id}"
+        try:
+            # 尚未初始化的用户不累加，下次读取时会从数据库完整初始化
+            if not self.redis_client.hexists(key, self.INIT_FIELD):
+                return
+            pipe = self.redis_client.pipeline()
+            for field, value in increments.items():
+                pipe.hincrbyfloat(key, field, sign * value)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error("更新强化学习参数失败: %s", str(e))
+
+    def reset(self, user_id: int):
+        """清除用户参数，下次读取时从数据库重新初始化"""
+        self.local_params.delete(str(user_id))
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.delete(f"{self.KEY_PREFIX}{user_id}")
+        except Exception as e:
+            logger.error("清除强化学习参数失败: %s", str(e))
+
+    def sample(self, params: Dict[str, float], labels: List[str]) -> Dict[str, float]:
+        """为每个类型从 Beta(先验a + 喜欢数, 先验b + 不喜欢数) 采样一个喜欢概率"""
+        if not labels:
+            return {}
+        alpha = np.array([self.prior_alpha + max(0.0, params.get(f"{label}:a", 0.0)) for label in labels])
+        beta = np.array([self.prior_beta + max(0.0, params.get(f"{label}:b", 0.0)) for label in labels])
+        return dict(zip(labels, self.rng.beta(alpha, beta)))
+
+    def rank(self, recommendations: List[int], params: Dict[str, float]) -> List[int]:
+        """按 位置先验 + RL_BANDIT_WEIGHT * 采样的类型喜欢概率 重新排序（推文多标签取平均，无类型推文取先验均值）
+
+        没有任何反馈的用户保持召回顺序：此时所有类型都是同一个先验，采样只会打乱排序。
+        """
+        if not any(value > 0 for value in params.values()):
+            return recommendations
+        labels = tweet_catalogue.get()['type_index'].labels
+        thetas = self.sample(params, labels)
+        prior_mean = self.prior_alpha / (self.prior_alpha + self.prior_beta)
+        position_scores = 1.0 - np.arange(len(recommendations)) / len(recommendations)
+        scores = position_scores + self.weight * tweet_catalogue.type_scores(recommendations, thetas, default=prior_mean)
+        order = np.argsort(-scores, kind='stable')
+        return [recommendations[idx] for idx in order]
 
 
 class ReinforcementLearningRecommender:
     """强化学习推荐器（基于用户反馈优化推荐）"""
 
-    def __init__(self):
+    # 每个用户参与过滤和排序的最近反馈条数（也是过滤可能去掉的推文数上限）
+    FEEDBACK_WINDOW = 100
+
+    def __init__(self, redis_client=None):
         self.learning_rate = Config.RL_LEARNING_RATE
         self.exploration_rate = Config.RL_EXPLORATION_RATE
         self.enabled = Config.RL_ENABLED
+        self.policy = Config.RL_POLICY
+        self.feedback_cache = LocalCache(Config.FEEDBACK_CACHE_SIZE, Config.FEEDBACK_CACHE_TTL)
+        self.bandit = ThompsonSamplingBandit(redis_client)
+
+    def invalidate_feedback(self, user_id: int):
+        """用户产生新反馈后清除其反馈缓存及在线学习参数"""
+        self.feedback_cache.delete(str(user_id))
+        self.bandit.reset(user_id)
 
     def load_user_feedback(self, user_id: int) -> Dict:
-        """加载用户反馈数据"""
+        """加载用户反馈数据（带进程内短期缓存）"""
+        cached = self.feedback_cache.get(str(user_id))
+        if cached is not None:
+            return cached
+
         query = """
             SELECT 
                 rf.tweets_id,
@@ -247,52 +1573,121 @@ class ReinforcementLearningRecommender:
             LEFT JOIN tweets t ON rf.tweets_id = t.id
             WHERE rf.client_user_id = :user_id
             ORDER BY rf.create_time DESC
-            LIMIT 100
+            LIMIT :limit
         """
-        result = db.execute_query(query, {'user_id': user_id})
+        result = db.execute_query(query, {'user_id': user_id, 'limit': self.FEEDBACK_WINDOW})
+        feedback_data = self.fold_feedback(self.merge_pending(user_id, result))
+        self.feedback_cache.set(str(user_id), feedback_data)
+        return feedback_data
+
+    def merge_pending(self, user_id: int, result: pd.DataFrame) -> pd.DataFrame:
+        """把缓冲区中尚未写入数据库的反馈合并到查询结果前面（覆盖同一推文的旧反馈）"""
+        pending = feedback_writer.pending_rows(user_id)
+        if not pending:
+            return result
+        pending_df = pd.DataFrame([{
+            'tweets_id': row['tweets_id'],
+            'feedback': row['feedback'],
+            'reward': row['reward'],
+            'tweets_type_cid': tweet_catalogue.type_cid(row['tweets_id']),
+        } for row in pending])
+        if result.empty:
+            return pending_df
+        result = result[~result['tweets_id'].isin(pending_df['tweets_id'])]
+        return pd.concat([pending_df, result], ignore_index=True).head(self.FEEDBACK_WINDOW)
+
+    def load_batch_feedback(self, user_ids: List[int]) -> Dict[int, Dict]:
+        """分批加载多个用户的反馈数据（ID按固定长度分批，每批一条SQL，在SQL中按用户取最近100条；
+        已缓存的用户不再查询）"""
+        feedback_by_user = {}
+        for user_id in user_ids:
+            cached = self.feedback_cache.get(str(user_id))
+            if cached is not None:
+                feedback_by_user[user_id] = cached
+        user_ids = [user_id for user_id in user_ids if user_id not in feedback_by_user]
+        if not user_ids:
+            return feedback_by_user
+        rows_by_user = {}
+        for batch in fixed_batches(user_ids, Config.SQL_IN_BATCH_SIZE):
+            placeholders, params = in_params('uid', batch)
+            params['limit'] = self.FEEDBACK_WINDOW
+            query = f"""
+                SELECT 
+                    recent.client_user_id,
+                    recent.tweets_id,
+                    recent.feedback,
+                    recent.reward,
+                    t.tweets_type_cid
+                FROM (
+                    SELECT 
+                        rf.client_user_id,
+                        rf.tweets_id,
+                        rf.feedback,
+                        rf.reward,
+                        ROW_NUMBER() OVER (PARTITION BY rf.client_user_id ORDER BY rf.create_time DESC) as rn
+                    FROM recommendation_feedback rf
+                    WHERE rf.client_user_id IN ({placeholders})
+                ) recent
+                LEFT JOIN tweets t ON recent.tweets_id = t.id
+                WHERE recent.rn <= :limit
+                ORDER BY recent.client_user_id, recent.rn
+            """
+            result = db.execute_query(query, params)
+            if not result.empty:
+                for user_id, rows in result.groupby('client_user_id', sort=False):
+                    rows_by_user[int(user_id)] = rows
+        for user_id in user_ids:
+            rows = rows_by_user.get(user_id, pd.DataFrame())
+            if feedback_writer.pending_rows(user_id):
+                rows = self.merge_pending(user_id, rows)
+            feedback_by_user[user_id] = self.fold_feedback(rows)
+            self.feedback_cache.set(str(user_id), feedback_by_user[user_id])
+        return feedback_by_user
+
+    def fold_feedback(self, result: pd.DataFrame) -> Dict:
+        """将反馈记录汇总为喜欢/不喜欢的推文、类型及类型权重（按类型分组聚合）"""
         if result.empty:
             return {
                 'liked_items': set(),
                 'disliked_items': set(),
-                'liked_types': defaultdict(float),
-                'disliked_types': defaultdict(float),
+                'liked_types': {},
+                'disliked_types': {},
                 'type_weights': {}
             }
         
-        liked_items = set()
-        disliked_items = set()
-        liked_types = defaultdict(float)
-        disliked_types = defaultdict(float)
-        type_weights = defaultdict(float)
+        # 未填写奖励值时，喜欢记为1，其他记为-1
+        feedback = result['feedback']
+        reward = pd.to_numeric(result['reward'], errors='coerce')
+        reward = reward.fillna(pd.Series(np.where(feedback == 'like', 1.0, -1.0), index=result.index))
         
-        for _, row in result.iterrows():
-            item_id = row['tweets_id']
-            feedback = row['feedback']
-            reward = row['reward'] if pd.notna(row['reward']) else (1 if feedback == 'like' else -1)
-            type_cid = str(row['tweets_type_cid']) if pd.notna(row['tweets_type_cid']) else ''
-            
-            if feedback == 'like':
-                liked_items.add(item_id)
-                if type_cid:
-                    liked_types[type_cid] += reward
-                    type_weights[type_cid] += reward * self.learning_rate
-            elif feedback == 'dislike':
-                disliked_items.add(item_id)
-                if type_cid:
-                    disliked_types[type_cid] += abs(reward)
-                    type_weights[type_cid] -= abs(reward) * self.learning_rate
+        liked_items = set(int(item_id) for item_id in result.loc[feedback == 'like', 'tweets_id'].dropna())
+        disliked_items = set(int(item_id) for item_id in result.loc[feedback == 'dislike', 'tweets_id'].dropna())
+        
+        # 多标签推文的反馈计入每个类型
+        labeled = pd.DataFrame({
+            'feedback': feedback,
+            'reward': reward,
+            'label': result['tweets_type_cid'].map(parse_type_cids),
+        }).explode('label').dropna(subset=['label'])
+        liked_types = labeled[labeled['feedback'] == 'like'].groupby('label')['reward'].sum()
+        disliked_types = labeled[labeled['feedback'] == 'dislike'].groupby('label')['reward'].apply(
+            lambda rewards: rewards.abs().sum())
+        type_weights = liked_types.mul(self.learning_rate).sub(
+            disliked_types.mul(self.learning_rate), fill_value=0.0)
         
         return {
             'liked_items': liked_items,
             'disliked_items': disliked_items,
-            'liked_types': dict(liked_types),
-            'disliked_types': dict(disliked_types),
-            'type_weights': dict(type_weights)
+            'liked_types': liked_types.astype(float).to_dict(),
+            'disliked_types': disliked_types.astype(float).to_dict(),
+            'type_weights': type_weights.astype(float).to_dict()
         }
 
-    def apply_rl_filtering(self, recommendations: List[int], user_id: int) -> List[int]:
+    def apply_rl_filtering(self, recommendations: List[int], user_id: int,
+                           feedback_data: Optional[Dict] = None) -> List[int]:
         """应用强化学习过滤和调整"""
-        feedback_data = self.load_user_feedback(user_id)
+        if feedback_data is None:
+            feedback_data = self.load_user_feedback(user_id)
         
         # 过滤掉用户明确不喜欢的推文
         filtered_recs = [item_id for item_id in recommendations 
@@ -304,73 +1699,464 @@ class ReinforcementLearningRecommender:
         
         return filtered_recs
 
-    def apply_rl_scoring(self, recommendations: List[int], user_id: int) -> List[int]:
-        """应用强化学习评分调整"""
-        feedback_data = self.load_user_feedback(user_id)
+    def static_adjustments(self, feedback_data: Dict) -> Dict[str, float]:
+        """static 策略下每个类型的调整值 = 强化学习权重 + 喜欢类型加分 - 不喜欢类型减分"""
+        adjustments = defaultdict(float)
+        for label, weight in feedback_data['type_weights'].items():
+            adjustments[label] += weight
+        for label, value in feedback_data['liked_types'].items():
+            adjustments[label] += value * 0.5
+        for label, value in feedback_data['disliked_types'].items():
+            adjustments[label] -= value * 0.3
+        return dict(adjustments)
+
+    def apply_rl_scoring(self, recommendations: List[int], user_id: int,
+                         feedback_data: Optional[Dict] = None,
+                         bandit_params: Optional[Dict[str, float]] = None) -> List[int]:
+        """应用强化学习评分调整（批量调用时可传入预先加载的反馈数据和在线学习参数）"""
+        if self.policy == 'thompson':
+            if not recommendations:
+                return recommendations
+            if bandit_params is None:
+                bandit_params = self.bandit.get_params(user_id)
+            return self.bandit.rank(recommendations, bandit_params)
+        
+        if feedback_data is None:
+            feedback_data = self.load_user_feedback(user_id)
         type_weights = feedback_data['type_weights']
         
         if not type_weights or not recommendations:
             return recommendations
         
-        # 加载推文类型信息（使用数据库连接池）
-        if len(recommendations) == 0:
-            return recommendations
-        
-        # 使用参数化查询构建IN子句（安全方式）
-        placeholders = ','.join([':id' + str(i) for i in range(len(recommendations))])
-        params = {f'id{i}': item_id for i, item_id in enumerate(recommendations)}
-        query = f"""
-            SELECT id, tweets_type_cid 
-            FROM tweets 
-            WHERE id IN ({placeholders})
-        """
-        
-        # 使用封装的数据库查询方法
-        tweet_types = db.execute_query(query, params)
-        
-        if tweet_types.empty:
-            return recommendations
-        
-        # 计算调整后的分数
-        item_scores = []
-        for item_id in recommendations:
-            score = 1.0  # 基础分数
-            
-            # 查找推文类型
-            tweet_type = tweet_types[tweet_types['id'] == item_id]
-            if not tweet_type.empty:
-                type_cid = str(tweet_type.iloc[0]['tweets_type_cid']) if pd.notna(tweet_type.iloc[0]['tweets_type_cid']) else ''
-                
-                # 应用强化学习权重
-                if type_cid in type_weights:
-                    score += type_weights[type_cid]
-                
-                # 用户喜欢的类型加分
-                if type_cid in feedback_data['liked_types']:
-                    score += feedback_data['liked_types'][type_cid] * 0.5
-                
-                # 用户不喜欢的类型减分
-                if type_cid in feedback_data['disliked_types']:
-                    score -= feedback_data['disliked_types'][type_cid] * 0.3
-            
-            item_scores.append((item_id, score))
+        # 从共享推文目录查找类型，多标签推文取各类型调整值的平均
+        scores = 1.0 + tweet_catalogue.type_scores(recommendations, self.static_adjustments(feedback_data))
         
         # 按调整后的分数重新排序
-        item_scores.sort(key=lambda x: x[1], reverse=True)
-        return [item_id for item_id, _ in item_scores]
+        order = np.argsort(-scores, kind='stable')
+        return [recommendations[idx] for idx in order]
+
+
+class TrendingIndex:
+    """热门推文索引（Redis ZSET trending:tweets + 进程内镜像），由点赞/收藏/浏览事件增量累加指数衰减分数
+
+    每个类型ID另有一个 trending:type:{类型ID} ZSET（含价格区间41~45），作为按类型的热门兜底列表。
+    分数以纪元 epoch 为基准存储：t 时刻的事件贡献 权重 * exp(λ(t - epoch))，
+    所有推文共享同一衰减因子 exp(-λ(now - epoch))，排序只比较存储值，不需要逐条衰减。
+    索引不存在时从 tweets 表计数初始化（各推文计数按发布时间计入），之后按 tweets_records 的ID水位线增量累加；
+    纪元超过 TRENDING_REBUILD_INTERVAL 后把所有分数乘以 exp(-λ(new_epoch - old_epoch)) 并移动纪元（排序不变，
+    只防止存储值溢出）；多个进程共用时由Redis锁（带持有者令牌）保证只有一个进程累加。
+    """
+
+    KEY = 'trending:tweets'
+    TYPE_KEY_PREFIX = 'trending:type:'
+    META_KEY = 'trending:meta'
+    TYPES_KEY = 'trending:types'
+    LOCK_KEY = 'trending:lock'
+    WEIGHTS = {'like': 3.0, 'collect': 2.0, 'browse': 1.0}
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+        self.decay = np.log(2) / Config.TRENDING_HALF_LIFE
+        self.refresh_interval = Config.TRENDING_REFRESH_INTERVAL
+        self.rebuild_interval = Config.TRENDING_REBUILD_INTERVAL
+        self.mirror_size = Config.TRENDING_MIRROR_SIZE
+        self.type_mirror_size = Config.TRENDING_TYPE_MIRROR_SIZE
+        self.epoch = 0.0
+        self.last_record_id = 0
+        self._scores = {}
+        self._type_scores = {}
+        self._mirror = []
+        self._type_mirrors = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load_seed(self) -> pd.DataFrame:
+        """加载有效推文的点赞/收藏/浏览计数及发布时间（重建时使用）"""
+        query = """
+            SELECT 
+                id,
+                like_num,
+                collect_num,
+                browse_num,
+                tweets_type_cid,
+                UNIX_TIMESTAMP(create_time) as created_at
+            FROM tweets
+            WHERE status IS NULL OR status != '0'
+        """
+        return db.execute_query(query)
+
+    def load_max_record_id(self) -> int:
+        result = db.execute_query("SELECT MAX(id) as max_id FROM tweets_records")
+        if result.empty or pd.isna(result.iloc[0]['max_id']):
+            return 0
+        return int(result.iloc[0]['max_id'])
+
+    def load_events(self, after_id: int, upto_id: int) -> pd.DataFrame:
+        """加载ID在 (after_id, upto_id] 区间内的点赞/收藏/浏览事件"""
+        query = """
+            SELECT tweets_id, type, UNIX_TIMESTAMP(create_time) as created_at
+            FROM tweets_records
+            WHERE type IN ('like', 'collect', 'browse')
+              AND id > :after_id AND id <= :upto_id
+        """
+        return db.execute_query(query, {'after_id': after_id, 'upto_id': upto_id})
+
+    def decayed(self, weights: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+        """事件相对纪元的存储分数"""
+        return weights * np.exp(self.decay * (timestamps - self.epoch))
+
+    def seed_scores(self, df: pd.DataFrame) -> Dict[int, float]:
+        if df.empty:
+            return {}
+        weights = (df['like_num'].fillna(0).astype(float) * self.WEIGHTS['like'] +
+                   df['collect_num'].fillna(0).astype(float) * self.WEIGHTS['collect'] +
+                   df['browse_num'].fillna(0).astype(float) * self.WEIGHTS['browse']).to_numpy()
+        timestamps = pd.to_numeric(df['created_at'], errors='coerce').fillna(self.epoch).to_numpy(dtype=np.float64)
+        scores = self.decayed(weights, timestamps)
+        return {int(item_id): float(score) for item_id, score in zip(df['id'], scores)}
+
+    def event_scores(self, df: pd.DataFrame) -> Dict[int, float]:
+        """按推文汇总一批事件的存储分数增量"""
+        if df.empty:
+            return {}
+        weights = df['type'].map(self.WEIGHTS).fillna(0.0).to_numpy(dtype=np.float64)
+        timestamps = pd.to_numeric(df['created_at'], errors='coerce').fillna(time.time()).to_numpy(dtype=np.float64)
+        increments = pd.Series(self.decayed(weights, timestamps)).groupby(df['tweets_id'].to_numpy()).sum()
+        return {int(item_id): float(score) for item_id, score in increments.items()}
+
+    def type_scores(self, scores: Dict[int, float], type_cid_of) -> Dict[str, Dict[int, float]]:
+        """把推文分数按类型ID分组（多标签推文计入每个类型）"""
+        by_label = defaultdict(dict)
+        for item_id, score in scores.items():
+            for label in parse_type_cids(type_cid_of(item_id)):
+                by_label[label][item_id] = score
+        return by_label
+
+    def try_lock(self) -> Optional[str]:
+        """跨进程互斥，成功时返回锁令牌，失败时返回None（没有Redis时只有本进程，直接成功）"""
+        token = uuid.uuid4().hex
+        if self.redis_client is None:
+            return token
+        return token if self.redis_client.set(self.LOCK_KEY, token, nx=True, ex=60) else None
+
+    def unlock(self, token: str):
+        """只释放自己持有的锁"""
+        if self.redis_client is not None:
+            self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, self.LOCK_KEY, token)
+
+    def build(self):
+        """索引不存在时从 tweets 表计数初始化，纪元为当前时间"""
+        max_id = self.load_max_record_id()
+        self.epoch = time.time()
+        seed = self.load_seed()
+        scores = self.seed_scores(seed)
+        type_cids = dict(zip(seed['id'].astype(int), seed['tweets_type_cid'])) if not seed.empty else {}
+        by_label = self.type_scores(scores, type_cids.get)
+        if self.redis_client is None:
+            self._scores = scores
+            self._type_scores = by_label
+        else:
+            pipe = self.redis_client.pipeline()
+            for key, key_scores in [(self.KEY, scores)] + [(f"{self.TYPE_KEY_PREFIX}{label}", label_scores)
+                                                           for label, label_scores in by_label.items()]:
+                temp_key = f"{key}:building"
+                pipe.delete(temp_key)
+                items = list(key_scores.items())
+                for start in range(0, len(items), Config.ITEM_INDEX_BATCH_SIZE):
+                    pipe.zadd(temp_key, dict(items[start:start + Config.ITEM_INDEX_BATCH_SIZE]))
+                if items:
+                    pipe.rename(temp_key, key)
+                else:
+                    pipe.delete(key)
+            pipe.delete(self.TYPES_KEY)
+            if by_label:
+                pipe.sadd(self.TYPES_KEY, *by_label)
+            pipe.hset(self.META_KEY, mapping={'epoch': self.epoch, 'last_record_id': max_id})
+            pipe.execute()
+        self.last_record_id = max_id
+
+    def rebase(self):
+        """把纪元移到当前时间：所有分数（含各类型列表）乘以同一衰减因子，近期事件的分数和排序保持不变"""
+        epoch = time.time()
+        factor = float(np.exp(-self.decay * (epoch - self.epoch)))
+        if self.redis_client is None:
+            self._scores = {item_id: score * factor for item_id, score in self._scores.items()}
+            self._type_scores = {label: {item_id: score * factor for item_id, score in label_scores.items()}
+                                 for label, label_scores in self._type_scores.items()}
+        else:
+            labels = [label.decode('utf-8') for label in self.redis_client.smembers(self.TYPES_KEY)]
+            pipe = self.redis_client.pipeline()
+            for key in [self.KEY] + [f"{self.TYPE_KEY_PREFIX}{label}" for label in labels]:
+                pipe.zunionstore(key, {key: factor})
+            pipe.hset(self.META_KEY, 'epoch', epoch)
+            pipe.execute()
+        self.epoch = epoch
+
+    def apply_events(self):
+        """累加上次水位线之后的新事件"""
+        max_id = self.load_max_record_id()
+        if max_id <= self.last_record_id:
+            return
+        increments = self.event_scores(self.load_events(self.last_record_id, max_id))
+        by_label = self.type_scores(increments, tweet_catalogue.type_cid)
+        if self.redis_client is None:
+            for item_id, score in increments.items():
+                self._scores[item_id] = self._scores.get(item_id, 0.0) + score
+            for label, label_scores in by_label.items():
+                type_scores = self._type_scores.setdefault(label, {})
+                for item_id, score in label_scores.items():
+                    type_scores[item_id] = type_scores.get(item_id, 0.0) + score
+        else:
+            pipe = self.redis_client.pipeline()
+            for item_id, score in increments.items():
+                pipe.zincrby(self.KEY, score, item_id)
+            for label, label_scores in by_label.items():
+                for item_id, score in label_scores.items():
+                    pipe.zincrby(f"{self.TYPE_KEY_PREFIX}{label}", score, item_id)
+            if by_label:
+                pipe.sadd(self.TYPES_KEY, *by_label)
+            pipe.hset(self.META_KEY, 'last_record_id', max_id)
+            pipe.execute()
+        self.last_record_id = max_id
+
+    def load_meta(self):
+        """读取共享的纪元和水位线（其他进程可能已经重建或累加）"""
+        if self.redis_client is None:
+            return
+        meta = self.redis_client.hgetall(self.META_KEY)
+        if meta:
+            self.epoch = float(meta.get(b'epoch', 0) or 0)
+            self.last_record_id = int(meta.get(b'last_record_id', 0) or 0)
+        else:
+            self.epoch = 0.0
+
+    def read_top(self, start: int, stop: int, label: Optional[str] = None) -> List[Tuple[int, float]]:
+        if self.redis_client is None:
+            scores = self._scores if label is None else self._type_scores.get(label, {})
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            return ranked[start:stop + 1]
+        key = self.KEY if label is None else f"{self.TYPE_KEY_PREFIX}{label}"
+        return [(int(member), float(score))
+                for member, score in self.redis_client.zrevrange(key, start, stop, withscores=True)]
+
+    def read_type_tops(self) -> Dict[str, List[Tuple[int, float]]]:
+        """一次读取所有类型热门列表的前 type_mirror_size 条"""
+        labels = tweet_catalogue.get()['type_index'].labels
+        if self.redis_client is None:
+            return {label: self.read_top(0, self.type_mirror_size - 1, label) for label in labels}
+        pipe = self.redis_client.pipeline()
+        for label in labels:
+            pipe.zrevrange(f"{self.TYPE_KEY_PREFIX}{label}", 0, self.type_mirror_size - 1, withscores=True)
+        return {label: [(int(member), float(score)) for member, score in ranked]
+                for label, ranked in zip(labels, pipe.execute())}
+
+    def refresh(self):
+        """到刷新间隔时重建或累加新事件，并更新进程内镜像（其他线程继续使用旧镜像）"""
+        if self._mirror and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        if not self._lock.acquire(blocking=not self._mirror):
+            return
+        try:
+            if self._mirror and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            try:
+                self.load_meta()
+                token = self.try_lock()
+                if token:
+                    try:
+                        self.load_meta()
+                        if not self.epoch:
+                            self.build()
+                        else:
+                            # 先按旧纪元累加新事件，再移动纪元
+                            self.apply_events()
+                            if time.time() - self.epoch >= self.rebuild_interval:
+                                self.rebase()
+                    finally:
+                        self.unlock(token)
+                self._mirror = self.read_top(0, self.mirror_size - 1)
+                self._type_mirrors = self.read_type_tops()
+            except Exception as e:
+                logger.error("刷新热门索引失败: %s", str(e))
+            self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def top(self, top_n: int, accept=None) -> List[int]:
+        """热度最高的 top_n 个推文ID（accept 为可选的过滤条件，如只保留有效推文）"""
+        self.refresh()
+        result = []
+        ranked = self._mirror
+        start = 0
+        while True:
+            for item_id, _ in ranked:
+                if accept is None or accept(item_id):
+                    result.append(item_id)
+                    if len(result) >= top_n:
+                        return result
+            # 镜像不够时继续向Redis分页读取
+            start += len(ranked)
+            if len(ranked) < self.mirror_size or self.redis_client is None and start >= len(self._scores):
+                return result
+            ranked = self.read_top(start, start + self.mirror_size - 1)
+            if not ranked:
+                return result
+
+    def top_by_type(self, label: str, top_n: int, accept=None) -> List[int]:
+        """某个类型ID（菜系或价格区间）下热度最高的推文ID，只读进程内镜像"""
+        self.refresh()
+        result = []
+        for item_id, _ in self._type_mirrors.get(label, []):
+            if accept is None or accept(item_id):
+                result.append(item_id)
+                if len(result) >= top_n:
+                    break
+        return result
+
+
+class RecommendationCache:
+    """推荐列表的两级缓存（进程内LRU + Redis；MGET批量读取、pipeline批量写入、int32紧凑二进制编码）
+
+    每个值带软过期时间：软过期前为新鲜数据，软过期后到Redis硬过期之间仍可返回（由调用方后台刷新），
+    软/硬过期时间都加随机抖动，避免同一批写入的键在同一秒过期。
+    每个值还带“候选已取尽”标记：列表比请求的深度短时，调用方据此判断是直接截取还是加深重新计算。
+    """
+
+    # 紧凑编码前缀，用于与旧的JSON列表缓存区分（\x02 带8字节软过期时间戳，\x03 再带1字节已取尽标记）
+    PACKED_PREFIX = b'\x01'
+    STAMPED_PREFIX = b'\x02'
+    FLAGGED_PREFIX = b'\x03'
+
+    def __init__(self, redis_client, local_cache: Optional[LocalCache] = None):
+        self.redis_client = redis_client
+        self.local_cache = local_cache or LocalCache(Config.LOCAL_CACHE_SIZE, Config.LOCAL_CACHE_TTL)
+        self.redis_hits = 0
+        self.redis_misses = 0
+
+    @classmethod
+    def encode(cls, items: List[int], fresh_until: float, exhausted: bool = False) -> bytes:
+        """编码为 软过期时间（小端float64）+ 已取尽标记（1字节）+ 小端int32数组"""
+        return (cls.FLAGGED_PREFIX + np.array([fresh_until], dtype='<f8').tobytes() +
+                (b'\x01' if exhausted else b'\x00') + np.asarray(items, dtype='<i4').tobytes())
+
+    @classmethod
+    def decode(cls, value) -> Optional[Tuple[List[int], float, bool]]:
+        """解码缓存值为 (推荐列表, 软过期时间, 是否已取尽)，兼容旧的编码和JSON列表（视为一直新鲜、未取尽）"""
+        if not value:
+            return None
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        if value.startswith(cls.FLAGGED_PREFIX):
+            header = len(cls.FLAGGED_PREFIX) + 8
+            fresh_until = float(np.frombuffer(value[len(cls.FLAGGED_PREFIX):header], dtype='<f8')[0])
+            return np.frombuffer(value[header + 1:], dtype='<i4').tolist(), fresh_until, value[header:header + 1] == b'\x01'
+        if value.startswith(cls.STAMPED_PREFIX):
+            header = len(cls.STAMPED_PREFIX) + 8
+            fresh_until = float(np.frombuffer(value[len(cls.STAMPED_PREFIX):header], dtype='<f8')[0])
+            return np.frombuffer(value[header:], dtype='<i4').tolist(), fresh_until, False
+        if value.startswith(cls.PACKED_PREFIX):
+            return np.frombuffer(value[len(cls.PACKED_PREFIX):], dtype='<i4').tolist(), float('inf'), False
+        return json.loads(value), float('inf'), False
+
+    @staticmethod
+    def jittered(ttl: float) -> float:
+        """过期时间加上 ±CACHE_TTL_JITTER 比例的随机抖动"""
+        return ttl * (1 + random.uniform(-Config.CACHE_TTL_JITTER, Config.CACHE_TTL_JITTER))
+
+    def get_entry(self, key: str) -> Optional[Tuple[List[int], float, bool]]:
+        return self.get_many_entries([key]).get(key)
+
+    def get_many_entries(self, keys: List[str]) -> Dict[str, Tuple[List[int], float, bool]]:
+        """先查进程内缓存，未命中的键一次MGET读取Redis并回填本地，返回命中的键的 (推荐列表, 软过期时间, 是否已取尽)"""
+        results = {}
+        redis_keys = []
+        for key in keys:
+            local = self.local_cache.get(key)
+            if local is not None:
+                results[key] = (list(local[0]), local[1], local[2])
+            else:
+                redis_keys.append(key)
+        if not self.redis_client or not redis_keys:
+            return results
+
+        try:
+            values = self.redis_client.mget(redis_keys)
+        except Exception as e:
+            logger.error("批量读取缓存失败: %s", str(e))
+            return results
+        for key, value in zip(redis_keys, values):
+            try:
+                entry = self.decode(value)
+            except Exception as e:
+                logger.error("解码缓存失败: %s %s", key, str(e))
+                entry = None
+            if entry is None:
+                self.redis_misses += 1
+                continue
+            self.redis_hits += 1
+            items, fresh_until, exhausted = entry
+            self.local_cache.set(key, (tuple(items), fresh_until, exhausted))
+            results[key] = entry
+        return results
+
+    def set(self, key: str, items: List[int], ttl: int, exhausted: bool = False):
+        self.set_many({key: items}, ttl, {key} if exhausted else None)
+
+    def set_many(self, mapping: Dict[str, List[int]], ttl: int, exhausted_keys: Optional[Set[str]] = None):
+        """写入本地缓存，并通过pipeline批量SETEX到Redis（ttl 为软过期时间，硬过期再加 CACHE_STALE_TTL；
+        exhausted_keys 中的键标记为候选已取尽；空列表不缓存）"""
+        mapping = {key: items for key, items in mapping.items() if items}
+        exhausted_keys = exhausted_keys or set()
+        entries = {}
+        now = time.time()
+        for key, items in mapping.items():
+            soft_ttl = self.jittered(ttl)
+            hard_ttl = int(soft_ttl + self.jittered(Config.CACHE_STALE_TTL))
+            exhausted = key in exhausted_keys
+            entries[key] = (items, now + soft_ttl, hard_ttl, exhausted)
+            self.local_cache.set(key, (tuple(items), now + soft_ttl, exhausted), hard_ttl)
+        if not self.redis_client or not entries:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, (items, fresh_until, hard_ttl, exhausted) in entries.items():
+                pipe.setex(key, hard_ttl, self.encode(items, fresh_until, exhausted))
+            pipe.execute()
+        except Exception as e:
+            logger.error("写入缓存失败: %s", str(e))
+
+    def delete(self, keys: List[str]):
+        """删除指定的键（本地 + 一次Redis DEL）"""
+        for key in keys:
+            self.local_cache.delete(key)
+        if not self.redis_client or not keys:
+            return
+        try:
+            self.redis_client.delete(*keys)
+        except Exception as e:
+            logger.error("删除缓存失败: %s", str(e))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各级缓存的命中/未命中计数"""
+        return {
+            'local': self.local_cache.stats(),
+            'redis': {'hits': self.redis_hits, 'misses': self.redis_misses},
+        }
 
 
 class Recommender:
     """对外提供推荐的引擎（协同过滤 + 内容过滤 + 混合推荐 + 强化学习）"""
 
-    def __init__(self):
+    def __init__(self, background_refresh: bool = False):
+        """background_refresh=True 时软过期的缓存先返回旧值并由后台线程刷新（只适用于常驻进程，
+        命令行脚本退出时会杀掉后台线程，因此默认把软过期视为未命中并同步重新计算）"""
         try:
             self.redis_client = redis.Redis(
                 host=Config.REDIS_HOST,
                 port=Config.REDIS_PORT,
                 password=Config.REDIS_PASSWORD,
                 db=Config.REDIS_DB,
-                decode_responses=True,
+                decode_responses=False,
                 socket_connect_timeout=5,
                 socket_timeout=5,
                 retry_on_timeout=True,
@@ -381,117 +2167,395 @@ class Recommender:
             logger.error("Redis连接失败: %s", str(e))
             self.redis_client = None
 
-        self.cf_recommender = CollaborativeFilteringRecommender()
-        self.cb_recommender = ContentBasedRecommender()
-        self.rl_recommender = ReinforcementLearningRecommender()
+        self.cache = RecommendationCache(self.redis_client)
+        self.seen_filter = SeenFilter(self.redis_client)
+        self.cf_recommender = CollaborativeFilteringRecommender(self.seen_filter)
+        self.item_index = ItemSimilarityIndex(self.redis_client, lambda: interaction_snapshot.get(check=True))
+        self.item_recommender = ItemBasedRecommender(self.item_index, self.seen_filter)
+        self.cb_recommender = ContentBasedRecommender(self.seen_filter)
+        self.rl_recommender = ReinforcementLearningRecommender(self.redis_client)
+        self.trending_index = TrendingIndex(self.redis_client)
+        # 混合推荐的协同过滤、内容过滤分支及反馈加载并行执行（各自从连接池取连接）
+        self.executor = ThreadPoolExecutor(max_workers=Config.HYBRID_WORKERS, thread_name_prefix='recommend')
+        # 曝光写入已看集合使用独立的小线程池，不占用混合推荐分支的线程
+        self.impression_executor = ThreadPoolExecutor(max_workers=Config.SEEN_FILTER_WORKERS,
+                                                      thread_name_prefix='impression')
+        # 软过期缓存的后台刷新：同一个键同时只刷新一次，总并发不超过 CACHE_REFRESH_WORKERS
+        self.background_refresh = background_refresh
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        self._refresh_slots = threading.BoundedSemaphore(Config.CACHE_REFRESH_WORKERS)
 
-    def load_tweets_data(self):
-        query = """
-            SELECT 
-                id as item_id,
-                like_num,
-                collect_num,
-                browse_num,
-                create_time
-            FROM tweets
-            WHERE status IS NULL OR status != '0'
-        """
-        return db.execute_query(query)
+    def get_recommendations(self, user_id: int, method: str = 'hybrid', top_n: Optional[int] = None,
+                            offset: int = 0) -> List[int]:
+        """获取推荐（每个用户/方法计算并缓存一个较深的列表，任意 top_n 和分页偏移 offset 都从中截取）
 
-    def get_recommendations(self, user_id: int, method: str = 'hybrid', top_n: Optional[int] = None) -> List[int]:
-        """获取推荐"""
+        返回过的推文写入已看集合，重新计算的列表不再包含它们：offset > 0 时保留旧列表的前 offset 条，
+        只在其后追加新推文；没有旧列表可保留时新列表从头就是下一页，直接取前 top_n 条且不缓存。
+        """
         top_n = top_n or Config.RECOMMENDATION_COUNT
-        cache_key = f"recommendations:{user_id}:{method}:{top_n}"
+        offset = max(0, offset)
+        cache_key = f"recommendations:{user_id}:{method}"
+
+        entry = self.cache.get_entry(cache_key)
+        if entry and self.covers(entry, offset + top_n) and self.usable(entry):
+            cached, fresh_until, _ = entry
+            # 软过期后先返回旧列表，由一个后台线程重新计算：翻页时保留到本页为止已返回的前缀，
+            # 第一页（从头浏览）不保留，否则每次刷新都会固定住同一个第一页
+            if fresh_until <= time.time():
+                self.refresh_in_background(user_id, method, cache_key, len(cached), offset + top_n if offset > 0 else 0)
+            return list(cached[offset:offset + top_n])
+
+        try:
+            recommendations, exhausted = self.compute_recommendations(user_id, method, self.cache_depth(offset + top_n))
+            if offset > 0:
+                if not entry or len(entry[0]) < offset:
+                    return recommendations[:top_n]
+                recommendations = self.keep_shown(entry[0][:offset], recommendations)
+            self.cache.set(cache_key, recommendations, Config.CACHE_EXPIRE_TIME, exhausted)
+            return recommendations[offset:offset + top_n]
+
+        except Exception as e:
+            logger.error("推荐执行错误: %s", str(e), exc_info=True)
+            return self.get_popular_items(offset + top_n)[offset:]
+
+    def refresh_in_background(self, user_id: int, method: str, cache_key: str, depth: int, shown: int):
+        """后台重新计算一个已软过期的推荐缓存（进程内单飞 + Redis锁保证多进程间也只刷新一次），
+        旧列表的前 shown 条已经返回过，保留在新列表前面"""
+        with self._refreshing_lock:
+            if cache_key in self._refreshing or not self._refresh_slots.acquire(blocking=False):
+                return
+            self._refreshing.add(cache_key)
+
+        lock_key = f"lock:{cache_key}"
+        token = uuid.uuid4().hex
+        try:
+            locked = self.redis_client is None or self.redis_client.set(
+                lock_key, token, nx=True, ex=Config.CACHE_REFRESH_LOCK_TTL)
+        except Exception as e:
+            logger.error("获取刷新锁失败: %s", str(e))
+            locked = False
+        if not locked:
+            self.release_refresh(cache_key, None, None)
+            return
+
+        def refresh():
+            try:
+                # 其他进程可能已经刷新过：丢弃本地旧值后重新读取，Redis中已是新鲜数据时只回填本地
+                self.cache.local_cache.delete(cache_key)
+                # 缓存已被删除（如用户产生了新反馈）时不写入：没有旧前缀，由下一次请求同步计算
+                entry = self.cache.get_entry(cache_key)
+                if not entry or entry[1] > time.time():
+                    return
+                recommendations, exhausted = self.compute_recommendations(user_id, method, self.cache_depth(depth))
+                recommendations = self.keep_shown(entry[0][:shown], recommendations)
+                self.cache.set(cache_key, recommendations, Config.CACHE_EXPIRE_TIME, exhausted)
+            except Exception as e:
+                logger.error("后台刷新推荐失败: %s", str(e), exc_info=True)
+            finally:
+                self.release_refresh(cache_key, lock_key, token)
+
+        # 守护线程：进程退出时不等待刷新完成
+        threading.Thread(target=refresh, name='cache-refresh', daemon=True).start()
 
-        if self.redis_client:
+    def release_refresh(self, cache_key: str, lock_key: Optional[str], token: Optional[str]):
+        with self._refreshing_lock:
+            self._refreshing.discard(cache_key)
+        self._refresh_slots.release()
+        if lock_key and self.redis_client is not None:
             try:
-                cached = self.redis_client.get(cache_key)
-                if cached:
-                    return json.loads(cached)
+                self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
             except Exception as e:
-                logger.error("读取推荐缓存失败: %s", str(e))
+                logger.error("释放刷新锁失败: %s", str(e))
 
+    @staticmethod
+    def keep_shown(shown: List[int], recommendations: List[int]) -> List[int]:
+        """已返回过的前缀保持原位置，后面只追加新列表中不在前缀里的推文（分页偏移仍然对应同一批推文）"""
+        shown_set = set(shown)
+        return list(shown) + [item_id for item_id in recommendations if item_id not in shown_set]
+
+    def usable(self, entry: Tuple[List[int], float, bool]) -> bool:
+        """缓存能否直接返回：新鲜的总是可以，软过期的只有开启后台刷新时才先返回旧值"""
+        return self.background_refresh or entry[1] > time.time()
+
+    def cache_depth(self, depth: int) -> int:
+        """实际计算的条数：向上取整到 RECOMMENDATION_CACHE_DEPTH 的倍数"""
+        step = max(1, Config.RECOMMENDATION_CACHE_DEPTH)
+        return max(step, -(-depth // step) * step)
+
+    def covers(self, entry: Tuple[List[int], float, bool], depth: int) -> bool:
+        """缓存列表能否满足前 depth 条（标记为候选已取尽的列表不再加深，同样可以直接截取）"""
+        cached, _, exhausted = entry
+        return len(cached) >= depth or exhausted
+
+    def compute_recommendations(self, user_id: int, method: str, top_n: int) -> Tuple[List[int], bool]:
+        """执行完整推荐流程（召回、兜底、强化学习排序），返回 (前 top_n 条, 候选是否已取尽)
+
+        启用强化学习时多召回 FEEDBACK_WINDOW 条，过滤掉不喜欢的推文后仍能凑满 top_n；
+        是否取尽按过滤之前的召回条数判断，召回分支超时或抛出异常时不标记为取尽。
+        """
+        recommendations = []
+        complete = True
+        recall_depth = top_n + (self.rl_recommender.FEEDBACK_WINDOW if self.rl_recommender.enabled else 0)
+        
+        # 反馈数据与推荐计算同时加载
+        feedback_future = None
+        deadline = time.monotonic() + Config.HYBRID_BRANCH_TIMEOUT
+        if self.rl_recommender.enabled:
+            feedback_future = self.executor.submit(self.rl_recommender.load_user_feedback, user_id)
+        
+        if method == 'collaborative' or method == 'cf':
+            recommendations = self.run_branch(self.cf_recommender.get_recommendations, "协同过滤", user_id, recall_depth)
+            complete = recommendations is not None
+        elif method == 'item' or method == 'itemcf':
+            recommendations = self.run_branch(self.item_recommender.get_recommendations, "物品协同过滤", user_id, recall_depth)
+            complete = recommendations is not None
+        elif method == 'content' or method == 'cb':
+            recommendations = self.run_branch(self.cb_recommender.get_recommendations, "内容过滤", user_id, recall_depth)
+            complete = recommendations is not None
+        else:
+            # 混合推荐（默认）：协同过滤和内容过滤并行执行，耗时为两者中较慢的一个；
+            # 协同过滤超时或失败时只使用内容过滤结果
+            cf_future = self.executor.submit(self.cf_recommender.get_recommendations, user_id, recall_depth)
+            cb_future = self.executor.submit(self.cb_recommender.get_recommendations, user_id, recall_depth)
+            cf_recs = self.wait_branch(cf_future, "协同过滤", None, deadline)
+            cb_recs = self.wait_branch(cb_future, "内容过滤", None, deadline)
+            complete = cf_recs is not None and cb_recs is not None
+            recommendations = self.merge_recommendations(cf_recs or [], cb_recs or [], recall_depth)
+        recommendations = recommendations or []
+
+        # 如果没有推荐结果，按用户偏好的类型返回热门物品
+        if not recommendations:
+            recommendations = self.get_fallback_items(user_id, recall_depth)
+        exhausted = complete and len(recommendations) < recall_depth
+        
+        # 应用强化学习优化（基于用户反馈）
+        if recommendations and self.rl_recommender.enabled:
+            try:
+                # 反馈数据只加载一次，供过滤和排序两个阶段共用
+                feedback_data = self.wait_branch(feedback_future, "反馈加载", None, deadline)
+                if feedback_data is None:
+                    raise RuntimeError("用户反馈加载失败")
+                
+                # 1. 过滤掉用户明确不喜欢的推文
+                recommendations = self.rl_recommender.apply_rl_filtering(recommendations, user_id, feedback_data)
+                
+                # 2. 根据用户反馈调整推荐排序
+                recommendations = self.rl_recommender.apply_rl_scoring(recommendations, user_id, feedback_data)
+            except Exception as e:
+                logger.error("强化学习优化失败: %s", str(e), exc_info=True)
+                # 如果强化学习失败，继续使用原始推荐
+
+        # 确保返回top_n个结果
+        return recommendations[:top_n], exhausted
+
+    def run_branch(self, func, name: str, *args):
+        """同步执行一个召回分支，失败时记录日志并返回None（与“没有候选”的空列表区分）"""
         try:
-            recommendations = []
-            
+            return func(*args)
+        except Exception as e:
+            logger.error("%s分支执行失败: %s", name, str(e), exc_info=True)
+            return None
+
+    def recall_each(self, func, name: str, user_ids: List[int], top_n: int, failed_users: Set[int]) -> Dict[int, List[int]]:
+        """逐个用户执行召回分支，失败的用户记入 failed_users 并使用空列表"""
+        results = {}
+        for user_id in user_ids:
+            recommendations = self.run_branch(func, name, user_id, top_n)
+            if recommendations is None:
+                failed_users.add(user_id)
+            results[user_id] = recommendations or []
+        return results
+
+    def wait_branch(self, future, name: str, default, deadline: float):
+        """等待并行分支结果直到 deadline，超时或失败时返回 default（超时的分支在后台继续执行完）"""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logger.error("%s分支超时（%s秒）", name, Config.HYBRID_BRANCH_TIMEOUT)
+        except Exception as e:
+            logger.error("%s分支执行失败: %s", name, str(e))
+        return default
+
+    def record_feedback(self, user_id: int, tweets_id: int, feedback: str) -> bool:
+        """接收一条推荐反馈：立即更新在线学习参数并清除推荐缓存，数据库写入交给后台批量完成"""
+        feedback = str(feedback).lower()
+        if feedback not in ('like', 'dislike'):
+            return False
+        reward = 1 if feedback == 'like' else -1
+
+        previous = feedback_writer.previous_feedback(user_id, tweets_id)
+        feedback_writer.add(user_id, tweets_id, feedback, reward)
+
+        # 同一推文的新反馈覆盖旧反馈：撤销旧反馈的计数再累加新反馈
+        if previous is None or previous['feedback'] != feedback:
+            bandit = self.rl_recommender.bandit
+            type_cid = tweet_catalogue.type_cid(tweets_id)
+            if previous is not None:
+                previous_reward = previous.get('reward')
+                bandit.observe(user_id, type_cid, previous['feedback'],
+                               abs(float(previous_reward)) if pd.notna(previous_reward) else 1.0, sign=-1.0)
+            bandit.observe(user_id, type_cid, feedback, abs(reward))
+
+        self.seen_filter.add(user_id, [tweets_id])
+        self.cache.delete(self.cache_keys(user_id))
+        self.rl_recommender.feedback_cache.delete(str(user_id))
+        return True
+
+    def record_impressions(self, user_id: int, item_ids: List[int]):
+        """记录返回给前端的推文（后台写入已看集合，之后重新计算推荐时不再出现；不清除当前缓存，分页继续截取同一列表）"""
+        if item_ids:
+            self.impression_executor.submit(self.seen_filter.add, user_id, list(item_ids))
+
+    def invalidate_user(self, user_id: int):
+        """用户产生新反馈后清除其推荐缓存和反馈缓存"""
+        self.cache.delete(self.cache_keys(user_id))
+        self.rl_recommender.invalidate_feedback(user_id)
+
+    def cache_keys(self, user_id: int) -> List[str]:
+        """用户所有推荐方法的缓存键"""
+        return [f"recommendations:{user_id}:{method}" for method in RECOMMENDATION_METHODS]
+
+    def merge_recommendations(self, cf_recs: List[int], cb_recs: List[int], top_n: int) -> List[int]:
+        """合并结果，优先协同过滤，补充内容过滤"""
+        recommendations = list(cf_recs)
+        for item_id in cb_recs:
+            if item_id not in recommendations:
+                recommendations.append(item_id)
+            if len(recommendations) >= top_n:
+                break
+        return recommendations
+
+    def get_batch_recommendations(self, user_ids: List[int], method: str = 'hybrid',
+                                  top_n: Optional[int] = None, use_cache: bool = True) -> Dict[int, List[int]]:
+        """批量获取推荐（共享一次矩阵加载、一次相似度块乘法和一次强化学习查询；use_cache=False 时忽略已有缓存并重新计算）"""
+        top_n = top_n or Config.RECOMMENDATION_COUNT
+        depth = self.cache_depth(top_n)
+        # 多召回 FEEDBACK_WINDOW 条，强化学习过滤后仍能凑满 depth
+        recall_depth = depth + (self.rl_recommender.FEEDBACK_WINDOW if self.rl_recommender.enabled else 0)
+        user_ids = list(dict.fromkeys(user_ids))
+        cache_keys = {user_id: f"recommendations:{user_id}:{method}" for user_id in user_ids}
+        results = {}
+
+        if use_cache:
+            cached = self.cache.get_many_entries([cache_keys[user_id] for user_id in user_ids])
+            now = time.time()
+            for user_id in user_ids:
+                entry = cached.get(cache_keys[user_id])
+                if entry and self.covers(entry, top_n) and self.usable(entry):
+                    results[user_id] = entry[0]
+                    if entry[1] <= now:
+                        self.refresh_in_background(user_id, method, cache_keys[user_id], len(entry[0]), 0)
+
+        missing_users = [user_id for user_id in user_ids if user_id not in results]
+        if not missing_users:
+            return {user_id: list(results[user_id][:top_n]) for user_id in user_ids}
+
+        try:
+            # 召回失败的用户（分支抛出异常）不标记为候选已取尽
+            failed_users = set()
             if method == 'collaborative' or method == 'cf':
-                recommendations = self.cf_recommender.get_recommendations(user_id, top_n)
+                computed = self.run_branch(self.cf_recommender.get_batch_recommendations, "批量协同过滤",
+                                           missing_users, recall_depth)
+                if computed is None:
+                    computed, failed_users = {}, set(missing_users)
+            elif method == 'item' or method == 'itemcf':
+                computed = self.recall_each(self.item_recommender.get_recommendations, "物品协同过滤",
+                                            missing_users, recall_depth, failed_users)
             elif method == 'content' or method == 'cb':
-                recommendations = self.cb_recommender.get_recommendations(user_id, top_n)
-            elif method == 'hybrid':
-                # 混合推荐：结合协同过滤和内容过滤
-                cf_recs = self.cf_recommender.get_recommendations(user_id, top_n)
-                cb_recs = self.cb_recommender.get_recommendations(user_id, top_n)
-                
-                # 合并结果，优先协同过滤，补充内容过滤
-                recommendations = list(cf_recs)
-                for item_id in cb_recs:
-                    if item_id not in recommendations:
-                        recommendations.append(item_id)
-                    if len(recommendations) >= top_n:
-                        break
+                computed = self.recall_each(self.cb_recommender.get_recommendations, "内容过滤",
+                                            missing_users, recall_depth, failed_users)
             else:
-                # 默认使用混合推荐
-                recommendations = self.get_recommendations(user_id, 'hybrid', top_n)
+                cf_results = self.run_branch(self.cf_recommender.get_batch_recommendations, "批量协同过滤",
+                                             missing_users, recall_depth)
+                if cf_results is None:
+                    cf_results, failed_users = {}, set(missing_users)
+                cb_results = self.recall_each(self.cb_recommender.get_recommendations, "内容过滤",
+                                              missing_users, recall_depth, failed_users)
+                computed = {
+                    user_id: self.merge_recommendations(cf_results.get(user_id, []), cb_results[user_id], recall_depth)
+                    for user_id in missing_users
+                }
 
-            # 如果没有推荐结果，返回热门物品
-            if not recommendations:
-                recommendations = self.get_popular_items(top_n)
-            
-            # 应用强化学习优化（基于用户反馈）
-            if recommendations and self.rl_recommender.enabled:
-                try:
-                    # 1. 过滤掉用户明确不喜欢的推文
-                    recommendations = self.rl_recommender.apply_rl_filtering(recommendations, user_id)
-                    
-                    # 2. 根据用户反馈调整推荐排序
-                    recommendations = self.rl_recommender.apply_rl_scoring(recommendations, user_id)
-                    
-                    # 确保返回top_n个结果
-                    recommendations = recommendations[:top_n]
-                except Exception as e:
-                    logger.error("强化学习优化失败: %s", str(e), exc_info=True)
-                    # 如果强化学习失败，继续使用原始推荐
+            # 没有推荐结果的用户按类型偏好使用热门物品
+            for user_id in missing_users:
+                if not computed.get(user_id):
+                    computed[user_id] = self.get_fallback_items(user_id, recall_depth)
+            # 强化学习过滤前不足 recall_depth 条的用户候选已取尽
+            exhausted_keys = {cache_keys[user_id] for user_id in missing_users
+                              if user_id not in failed_users and len(computed[user_id]) < recall_depth}
 
-            if recommendations and self.redis_client:
+            # 应用强化学习优化：一次查询加载所有用户反馈，推文类型从共享推文目录查找
+            if self.rl_recommender.enabled:
                 try:
-                    self.redis_client.setex(cache_key, Config.CACHE_EXPIRE_TIME, json.dumps(recommendations))
+                    feedback_by_user = self.rl_recommender.load_batch_feedback(missing_users)
+                    params_by_user = (self.rl_recommender.bandit.get_params_many(missing_users)
+                                      if self.rl_recommender.policy == 'thompson' else {})
+                    for user_id in missing_users:
+                        feedback_data = feedback_by_user[user_id]
+                        recommendations = self.rl_recommender.apply_rl_filtering(
+                            computed[user_id], user_id, feedback_data)
+                        recommendations = self.rl_recommender.apply_rl_scoring(
+                            recommendations, user_id, feedback_data, params_by_user.get(user_id))
+                        computed[user_id] = recommendations
                 except Exception as e:
-                    logger.error("写入推荐缓存失败: %s", str(e))
+                    logger.error("批量强化学习优化失败: %s", str(e), exc_info=True)
+            computed = {user_id: computed[user_id][:depth] for user_id in missing_users}
 
-            return recommendations
+            self.cache.set_many({cache_keys[user_id]: computed[user_id] for user_id in missing_users},
+                                Config.CACHE_EXPIRE_TIME, exhausted_keys)
 
-        except Exception as e:
-            logger.error("推荐执行错误: %s", str(e), exc_info=True)
-            return self.get_popular_items(top_n)
+            results.update(computed)
 
-    def get_popular_items(self, top_n: int = 20) -> List[int]:
-        """获取热门物品"""
-        cache_key = f"popular_items:{top_n}"
-        if self.redis_client:
-            try:
-                cached = self.redis_client.get(cache_key)
-                if cached:
-                    return json.loads(cached)
-            except Exception as e:
-                logger.error("读取热门缓存失败: %s", str(e))
-
-        tweets_df = self.load_tweets_data()
-        if tweets_df.empty:
-            return []
+        except Exception as e:
+            logger.error("批量推荐执行错误: %s", str(e), exc_info=True)
+            popular_items = self.get_popular_items(top_n)
+            for user_id in missing_users:
+                results[user_id] = list(popular_items)
 
-        tweets_df['popularity_score'] = (
-            (tweets_df['like_num'].fillna(0) * 3) +
-            (tweets_df['collect_num'].fillna(0) * 2) +
-            (tweets_df['browse_num'].fillna(0) * 1)
-        ) / (pd.Timestamp.now() - pd.to_datetime(tweets_df['create_time'])).dt.total_seconds() / 86400 + 1
+        return {user_id: list(results.get(user_id, [])[:top_n]) for user_id in user_ids}
 
-        popular = tweets_df.nlargest(top_n, 'popularity_score')['item_id'].tolist()
+    def get_fallback_items(self, user_id: int, top_n: int = 20) -> List[int]:
+        """冷启动兜底：按用户的类型偏好（行为统计及与类型名称相同的标签）从各类型热门列表取推文，不足时补全局热门"""
+        try:
+            profile = self.cb_recommender.load_user_profile(user_id)
+            catalogue = tweet_catalogue.get()
+            label_weights = dict(profile['type_preferences'])
+            labels_by_name = {name: label for label, name in catalogue['type_names'].items()}
+            for tag in profile['tags']:
+                if tag in labels_by_name:
+                    label = labels_by_name[tag]
+                    label_weights[label] = label_weights.get(label, 0.0) + 1.0 / len(profile['tags'])
+            if not label_weights:
+                return self.get_popular_items(top_n)
 
-        if self.redis_client:
-            try:
-                self.redis_client.setex(cache_key, 1800, json.dumps(popular))
-            except Exception as e:
-                logger.error("写入热门缓存失败: %s", str(e))
+            # 每个类型按权重分配名额
+            positions = catalogue['positions']
+            seen_bits = self.seen_filter.user_bits(user_id)
+            accept = lambda item_id: item_id in positions and not self.seen_filter.contains(seen_bits, [item_id])[0]
+            total_weight = sum(label_weights.values())
+            recommendations = []
+            for label, weight in sorted(label_weights.items(), key=lambda item: item[1], reverse=True):
+                quota = max(1, int(np.ceil(top_n * weight / total_weight)))
+                for item_id in self.trending_index.top_by_type(label, quota + len(recommendations), accept):
+                    if item_id not in recommendations:
+                        recommendations.append(item_id)
+                        quota -= 1
+                        if quota <= 0:
+                            break
+                if len(recommendations) >= top_n:
+                    break
+            for item_id in self.get_popular_items(top_n + len(recommendations)):
+                if len(recommendations) >= top_n:
+                    break
+                if item_id not in recommendations:
+                    recommendations.append(item_id)
+            return recommendations[:top_n]
+        except Exception as e:
+            logger.error("类型热门兜底失败: %s", str(e), exc_info=True)
+            return self.get_popular_items(top_n)
 
-        return popular
+    def get_popular_items(self, top_n: int = 20) -> List[int]:
+        """获取热门物品（所有 top_n 共用一个热门索引，只返回当前有效的推文）"""
+        positions = tweet_catalogue.get()['positions']
+        return self.trending_index.top(top_n, accept=lambda item_id: item_id in positions)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+强化学习排序策略离线回放评估脚本
+
+按时间顺序回放 recommendation_feedback：每条反馈到达前，用各策略当时的状态
+给该推文打分，然后再把这条反馈计入状态。以“喜欢”为正例计算各策略分数的AUC，
+用于比较 static（近100条反馈的类型权重）与 thompson（汤普森采样）策略。
+
+用法:
+    python3 evaluate_rl_policies.py [--days 90] [--seed 0]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import defaultdict, deque
+
+logging.basicConfig(
+    level=logging.ERROR,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+import pandas as pd
+
+from engine import ReinforcementLearningRecommender, ThompsonSamplingBandit, parse_type_cids
+from database import db
+
+def output_json(code, data, message):
+    """输出JSON格式结果"""
+    result = {
+        "code": code,
+        "data": data,
+        "message": message
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    sys.stdout.flush()
+
+def load_feedback_events(days):
+    """按时间顺序加载最近N天的反馈记录"""
+    query = """
+        SELECT 
+            rf.client_user_id,
+            rf.tweets_id,
+            rf.feedback,
+            rf.reward,
+            t.tweets_type_cid
+        FROM recommendation_feedback rf
+        LEFT JOIN tweets t ON rf.tweets_id = t.id
+        WHERE rf.create_time >= DATE_SUB(NOW(), INTERVAL :days DAY)
+        ORDER BY rf.create_time, rf.id
+    """
+    return db.execute_query(query, {'days': days})
+
+def auc(labels, scores):
+    """AUC（Mann-Whitney U，并列分数取平均秩）"""
+    labels = np.asarray(labels, dtype=bool)
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        return None
+    ranks = pd.Series(scores).rank(method='average').to_numpy()
+    return float((ranks[labels].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+def replay(events, seed):
+    """回放反馈，返回正负例标签及各策略的打分"""
+    rl = ReinforcementLearningRecommender()
+    bandit = ThompsonSamplingBandit()
+    bandit.rng = np.random.default_rng(seed)
+    prior_mean = bandit.prior_alpha / (bandit.prior_alpha + bandit.prior_beta)
+
+    history = defaultdict(lambda: deque(maxlen=100))
+    adjustments = {}
+    params = defaultdict(lambda: defaultdict(float))
+    labels = []
+    scores = {'static': [], 'thompson': [], 'posterior_mean': []}
+
+    for row in events.itertuples(index=False):
+        type_labels = parse_type_cids(row.tweets_type_cid)
+        if row.feedback not in ('like', 'dislike') or not type_labels:
+            continue
+        user_id = int(row.client_user_id)
+        user_params = params[user_id]
+
+        # 先用反馈到达前的状态打分（多标签取平均）
+        user_adjustments = adjustments.get(user_id, {})
+        scores['static'].append(1.0 + np.mean([user_adjustments.get(label, 0.0) for label in type_labels]))
+        thetas = bandit.sample(user_params, type_labels)
+        scores['thompson'].append(float(np.mean([thetas[label] for label in type_labels])))
+        means = [(bandit.prior_alpha + user_params[f"{label}:a"]) /
+                 (bandit.prior_alpha + bandit.prior_beta + user_params[f"{label}:a"] + user_params[f"{label}:b"])
+                 for label in type_labels]
+        scores['posterior_mean'].append(float(np.mean(means)) if means else prior_mean)
+        labels.append(row.feedback == 'like')
+
+        # 再把这条反馈计入各策略状态
+        weight = float(row.reward) if pd.notna(row.reward) else 1.0
+        history[user_id].appendleft(row._asdict())
+        adjustments[user_id] = rl.static_adjustments(rl.fold_feedback(pd.DataFrame(list(history[user_id]))))
+        for field, value in bandit.credit(row.tweets_type_cid, row.feedback, weight).items():
+            user_params[field] += value
+
+    return labels, scores
+
+def main():
+    parser = argparse.ArgumentParser(description='强化学习排序策略离线回放评估')
+    parser.add_argument('--days', type=int, default=90, help='回放最近N天的反馈')
+    parser.add_argument('--seed', type=int, default=0, help='汤普森采样随机种子')
+    args = parser.parse_args()
+
+    try:
+        events = load_feedback_events(args.days)
+        if events.empty:
+            output_json(200, {"events": 0, "policies": {}}, "success")
+            return
+
+        labels, scores = replay(events, args.seed)
+        policies = {name: {"auc": auc(labels, values)} for name, values in scores.items()}
+        output_json(200, {
+            "events": len(labels),
+            "likes": int(sum(labels)),
+            "dislikes": len(labels) - int(sum(labels)),
+            "policies": policies
+        }, "success")
+
+    except KeyboardInterrupt:
+        output_json(500, None, "执行被中断")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"回放评估失败: {str(e)}", exc_info=True)
+        output_json(500, None, f"Internal server error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量推荐命令行脚本
+一次进程内为多个用户计算推荐（共享一次矩阵加载和强化学习查询），
+用于推送分发和缓存预热
+
+用法:
+    python3 get_batch_recommendations.py <user_ids> [method] [top_n]
+
+参数:
+    user_ids: 用户ID列表，逗号分隔（必需）
+    method:   推荐方法（默认: hybrid，可选值同 get_recommendations.py）
+    top_n:    推荐数量（默认: 20）
+
+示例:
+    python3 get_batch_recommendations.py 1,2,3 hybrid 20
+
+输出:
+    data 为 {用户ID: 推荐推文ID列表} 的映射
+"""
+import sys
+import json
+import os
+import logging
+
+logging.basicConfig(
+    level=logging.ERROR,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from engine import Recommender
+from config import Config
+
+def parse_user_ids(value):
+    """解析逗号分隔的用户ID列表，忽略非法值"""
+    user_ids = []
+    for part in str(value).split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            user_ids.append(int(part))
+    return user_ids
+
+def parse_args():
+    """解析命令行参数"""
+    if len(sys.argv) < 2:
+        return None, None, None
+    
+    try:
+        user_ids = parse_user_ids(sys.argv[1])
+        method = sys.argv[2] if len(sys.argv) > 2 else 'hybrid'
+        top_n = int(sys.argv[3]) if len(sys.argv) > 3 else Config.RECOMMENDATION_COUNT
+        
+        if not user_ids:
+            return None, None, None
+        
+        valid_methods = ['collaborative', 'cf', 'item', 'itemcf', 'content', 'cb', 'hybrid', 'popular']
+        if method not in valid_methods:
+            method = 'hybrid'
+        
+        if top_n <= 0:
+            top_n = Config.RECOMMENDATION_COUNT
+        
+        return user_ids, method, top_n
+        
+    except (ValueError, IndexError):
+        return None, None, None
+
+def output_json(code, data, message):
+    """输出JSON格式结果"""
+    result = {
+        "code": code,
+        "data": data,
+        "message": message
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    sys.stdout.flush()
+
+def main():
+    """主函数：批量获取推荐"""
+    try:
+        user_ids, method, top_n = parse_args()
+        
+        if user_ids is None:
+            output_json(400, None, "参数错误。用法: python3 get_batch_recommendations.py <user_ids> [method] [top_n]")
+            sys.exit(1)
+        
+        recommender = Recommender()
+        results = recommender.get_batch_recommendations(user_ids, method=method, top_n=top_n)
+        
+        output_json(200, {str(user_id): recs for user_id, recs in results.items()}, "success")
+        
+    except KeyboardInterrupt:
+        output_json(500, None, "执行被中断")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"批量获取推荐失败: {str(e)}", exc_info=True)
+        output_json(500, None, f"Internal server error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
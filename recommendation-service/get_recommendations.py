@@ -5,19 +5,22 @@
 可以直接从Java调用，无需启动服务
 
 用法:
-    python3 get_recommendations.py <user_id> [method] [top_n]
+    python3 get_recommendations.py <user_id> [method] [top_n] [offset]
 
 参数:
     user_id: 用户ID（必需）
     method:  推荐方法（默认: hybrid）
               - collaborative/cf: 协同过滤推荐
+              - item/itemcf: 物品协同过滤推荐（需先运行 refresh_item_index.py 构建近邻索引）
               - content/cb: 内容过滤推荐
               - hybrid: 混合推荐（协同过滤+内容过滤，默认）
               - popular: 热门推荐
     top_n:   推荐数量（默认: 20）
+    offset:  分页偏移（默认: 0，第二页传 top_n，依此类推）
 
 示例:
     python3 get_recommendations.py 1 hybrid 20
+    python3 get_recommendations.py 1 hybrid 20 20  # 第二页
     python3 get_recommendations.py 1 collaborative
     python3 get_recommendations.py 1  # 默认使用混合推荐
 """
@@ -44,29 +47,33 @@ from config import Config
 def parse_args():
     """解析命令行参数"""
     if len(sys.argv) < 2:
-        return None, None, None
+        return None, None, None, None
     
     try:
         user_id = int(sys.argv[1])
         method = sys.argv[2] if len(sys.argv) > 2 else 'hybrid'  # 默认使用混合推荐
         top_n = int(sys.argv[3]) if len(sys.argv) > 3 else Config.RECOMMENDATION_COUNT
+        offset = int(sys.argv[4]) if len(sys.argv) > 4 else 0
         
         # 验证参数
         if user_id <= 0:
-            return None, None, None
+            return None, None, None, None
         
         # 支持的推荐方法
-        valid_methods = ['collaborative', 'cf', 'content', 'cb', 'hybrid', 'popular']
+        valid_methods = ['collaborative', 'cf', 'item', 'itemcf', 'content', 'cb', 'hybrid', 'popular']
         if method not in valid_methods:
             method = 'hybrid'  # 如果不是有效方法，默认使用混合推荐
         
         if top_n <= 0:
             top_n = Config.RECOMMENDATION_COUNT
         
-        return user_id, method, top_n
+        if offset < 0:
+            offset = 0
+        
+        return user_id, method, top_n, offset
         
     except (ValueError, IndexError):
-        return None, None, None
+        return None, None, None, None
 
 def output_json(code, data, message):
     """输出JSON格式结果"""
@@ -82,20 +89,23 @@ def main():
     """主函数：从命令行参数获取输入，输出JSON结果"""
     try:
         # 解析命令行参数
-        user_id, method, top_n = parse_args()
+        user_id, method, top_n, offset = parse_args()
         
         if user_id is None:
-            output_json(400, None, "参数错误。用法: python3 get_recommendations.py <user_id> [method] [top_n]")
+            output_json(400, None, "参数错误。用法: python3 get_recommendations.py <user_id> [method] [top_n] [offset]")
             sys.exit(1)
         
         # 执行推荐
         recommender = Recommender()
-        recommendations = recommender.get_recommendations(user_id, method=method, top_n=top_n)
+        recommendations = recommender.get_recommendations(user_id, method=method, top_n=top_n, offset=offset)
         
-        # 如果没有推荐结果，返回热门物品
-        if not recommendations:
+        # 如果第一页没有推荐结果，返回热门物品（后续页为空表示已经翻到底）
+        if not recommendations and offset == 0:
             recommendations = recommender.get_popular_items(top_n)
         
+        # 返回的推文记为已曝光（之后重新计算推荐时排除）
+        recommender.record_impressions(user_id, recommendations)
+        
         # 输出JSON结果
         output_json(200, recommendations, "success")
         
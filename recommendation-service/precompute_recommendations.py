@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线预计算推荐脚本（供定时任务调用）
+
+为最近N天活跃的用户计算推荐并写入Redis（键与在线请求一致：
+recommendations:{user_id}:{method}，缓存 RECOMMENDATION_CACHE_DEPTH 条，
+任意 top_n 和分页都从中截取），在线请求基本都能直接命中缓存。
+父进程先加载用户-物品矩阵，再按用户分片fork多个子进程并行计算，
+子进程只读共享父进程的矩阵，不再各自加载。
+
+用法:
+    python3 precompute_recommendations.py [--days 7] [--method hybrid] [--top-n 20] [--workers 4]
+
+示例（crontab，每30分钟执行一次，间隔应小于 CACHE_EXPIRE_TIME）:
+    */30 * * * * python3 /path/to/recommendation-service/precompute_recommendations.py
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logging.basicConfig(
+    level=logging.ERROR,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from engine import Recommender, RECOMMENDATION_METHODS, interaction_snapshot
+from config import Config
+from database import db
+
+worker_recommender = None
+
+def output_json(code, data, message):
+    """输出JSON格式结果"""
+    result = {
+        "code": code,
+        "data": data,
+        "message": message
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    sys.stdout.flush()
+
+def load_active_users(days):
+    """加载最近N天有交互记录的用户"""
+    query = """
+        SELECT DISTINCT client_user_id
+        FROM tweets_records
+        WHERE create_time >= DATE_SUB(NOW(), INTERVAL :days DAY)
+    """
+    result = db.execute_query(query, {'days': days})
+    if result.empty:
+        return []
+    return sorted(int(user_id) for user_id in result['client_user_id'].dropna().tolist())
+
+def init_worker():
+    """子进程初始化：丢弃继承的数据库连接，固定继承的矩阵快照"""
+    global worker_recommender
+    db.engine.dispose(close=False)
+    interaction_snapshot.pin()
+    worker_recommender = Recommender()
+
+def compute_shard(user_ids, method, top_n):
+    """计算一个分片的推荐并写入缓存，返回有结果的用户数"""
+    results = worker_recommender.get_batch_recommendations(user_ids, method=method, top_n=top_n, use_cache=False)
+    return sum(1 for recs in results.values() if recs)
+
+def main():
+    parser = argparse.ArgumentParser(description='离线预计算活跃用户推荐')
+    parser.add_argument('--days', type=int, default=Config.PRECOMPUTE_ACTIVE_DAYS, help='活跃天数')
+    parser.add_argument('--method', default='hybrid', choices=RECOMMENDATION_METHODS, help='推荐方法')
+    parser.add_argument('--top-n', type=int, default=Config.RECOMMENDATION_COUNT, help='推荐数量')
+    parser.add_argument('--workers', type=int, default=Config.PRECOMPUTE_WORKERS, help='并行进程数')
+    args = parser.parse_args()
+
+    try:
+        user_ids = load_active_users(args.days)
+        if not user_ids:
+            output_json(200, {"users": 0, "computed": 0}, "success")
+            return
+
+        # 在fork之前加载矩阵并完成归一化，子进程通过写时复制共享
+        matrix = interaction_snapshot.get()
+        if not matrix.empty:
+            matrix.normalized()
+        db.engine.dispose()
+
+        shard_size = max(1, Config.PRECOMPUTE_SHARD_SIZE)
+        shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+        computed = 0
+        failed_shards = 0
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=context,
+                                 initializer=init_worker) as executor:
+            futures = [executor.submit(compute_shard, shard, args.method, args.top_n) for shard in shards]
+            for future in as_completed(futures):
+                try:
+                    computed += future.result()
+                except Exception as e:
+                    failed_shards += 1
+                    logging.error(f"分片预计算失败: {str(e)}", exc_info=True)
+
+        output_json(200, {"users": len(user_ids), "computed": computed, "failed_shards": failed_shards}, "success")
+
+    except KeyboardInterrupt:
+        output_json(500, None, "执行被中断")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"预计算推荐失败: {str(e)}", exc_info=True)
+        output_json(500, None, f"Internal server error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
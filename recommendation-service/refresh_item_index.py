@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+物品近邻索引刷新脚本（供定时任务调用）
+
+默认增量刷新：重新计算上次刷新后有新交互的推文及其前后近邻的列表，并轮流重算一个分片（ITEM_INDEX_SHARD_SIZE）；
+索引不存在或指定 --full 时全量重建。
+
+用法:
+    python3 refresh_item_index.py [--full]
+
+示例（crontab，每5分钟增量刷新一次）:
+    */5 * * * * python3 /path/to/recommendation-service/refresh_item_index.py
+"""
+import sys
+import json
+import os
+import logging
+
+logging.basicConfig(
+    level=logging.ERROR,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from engine import Recommender
+
+def output_json(code, data, message):
+    """输出JSON格式结果"""
+    result = {
+        "code": code,
+        "data": data,
+        "message": message
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    sys.stdout.flush()
+
+def main():
+    """主函数：刷新物品近邻索引"""
+    try:
+        full = '--full' in sys.argv[1:]
+        
+        recommender = Recommender()
+        if not recommender.redis_client:
+            output_json(500, None, "Redis不可用，无法刷新物品近邻索引")
+            sys.exit(1)
+        
+        if full:
+            updated = recommender.item_index.build()
+        else:
+            updated = recommender.item_index.refresh()
+        
+        output_json(200, {"full": full, "updated": updated}, "success")
+        
+    except KeyboardInterrupt:
+        output_json(500, None, "执行被中断")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"刷新物品近邻索引失败: {str(e)}", exc_info=True)
+        output_json(500, None, f"Internal server error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+推荐服务常驻进程（HTTP JSON 接口）
+
+与 get_recommendations.py / get_popular.py 返回相同的 {code, data, message} 结构，
+但 Recommender、数据库连接池和 Redis 客户端在进程内常驻复用，
+避免每次请求都重新启动解释器、导入 pandas/numpy 并重建连接。
+
+用法:
+    python3 server.py [--host 127.0.0.1] [--port 5001]
+
+接口:
+    GET /recommendations?user_id=1&method=hybrid&top_n=20&offset=0（offset 用于分页，从同一个缓存列表截取；返回的推文记为已曝光）
+    GET /popular?top_n=20
+    GET /batch_recommendations?user_ids=1,2,3&method=hybrid&top_n=20
+    POST /batch_recommendations  {"user_ids": [1, 2, 3], "method": "hybrid", "top_n": 20}
+    POST /feedback  {"user_id": 1, "tweets_id": 2, "feedback": "like"}（立即更新在线学习参数，后台批量写库）
+    POST /cache/invalidate  {"user_id": 1}（用户反馈写入后清除其推荐缓存）
+    GET /cache/stats
+    GET /health
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from engine import Recommender, RECOMMENDATION_METHODS, feedback_writer
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+VALID_METHODS = list(RECOMMENDATION_METHODS)
+
+
+def build_response(code, data, message):
+    """构建与命令行脚本一致的JSON结构"""
+    return {
+        "code": code,
+        "data": data,
+        "message": message
+    }
+
+
+def parse_top_n(value):
+    """解析推荐数量，非法值使用默认数量"""
+    try:
+        top_n = int(value) if value is not None else Config.RECOMMENDATION_COUNT
+    except ValueError:
+        return Config.RECOMMENDATION_COUNT
+    return top_n if top_n > 0 else Config.RECOMMENDATION_COUNT
+
+
+def parse_offset(value):
+    """解析分页偏移，非法值按0处理"""
+    try:
+        offset = int(value) if value is not None else 0
+    except ValueError:
+        return 0
+    return offset if offset > 0 else 0
+
+
+def parse_user_ids(value):
+    """解析逗号分隔的用户ID列表，忽略非法值"""
+    user_ids = []
+    for part in str(value).split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            user_ids.append(int(part))
+    return user_ids
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """推荐请求处理器（所有请求共享 server.recommender）"""
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        try:
+            if parsed.path == '/recommendations':
+                self.handle_recommendations(params)
+            elif parsed.path == '/popular':
+                self.handle_popular(params)
+            elif parsed.path == '/batch_recommendations':
+                self.handle_batch_recommendations(params)
+            elif parsed.path == '/cache/stats':
+                self.send_json(200, build_response(200, self.server.recommender.cache.stats(), "success"))
+            elif parsed.path == '/health':
+                self.send_json(200, build_response(200, None, "success"))
+            else:
+                self.send_json(404, build_response(404, None, "Not found"))
+        except Exception as e:
+            logger.error("处理请求失败: %s", str(e), exc_info=True)
+            self.send_json(500, build_response(500, None, f"Internal server error: {str(e)}"))
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            try:
+                params = json.loads(body.decode('utf-8')) if body else {}
+            except ValueError:
+                params = None
+            if not isinstance(params, dict):
+                self.send_json(400, build_response(400, None, "请求体必须是JSON对象"))
+                return
+
+            if parsed.path == '/batch_recommendations':
+                self.handle_batch_recommendations(params)
+            elif parsed.path == '/feedback':
+                self.handle_feedback(params)
+            elif parsed.path == '/cache/invalidate':
+                self.handle_invalidate(params)
+            else:
+                self.send_json(404, build_response(404, None, "Not found"))
+        except Exception as e:
+            logger.error("处理请求失败: %s", str(e), exc_info=True)
+            self.send_json(500, build_response(500, None, f"Internal server error: {str(e)}"))
+
+    def handle_recommendations(self, params):
+        try:
+            user_id = int(params.get('user_id', ''))
+        except ValueError:
+            user_id = 0
+        if user_id <= 0:
+            self.send_json(400, build_response(400, None, "参数错误。用法: /recommendations?user_id=<user_id>&method=<method>&top_n=<top_n>"))
+            return
+
+        method = params.get('method', 'hybrid')
+        if method not in VALID_METHODS:
+            method = 'hybrid'
+        top_n = parse_top_n(params.get('top_n'))
+        offset = parse_offset(params.get('offset'))
+
+        recommender = self.server.recommender
+        recommendations = recommender.get_recommendations(user_id, method=method, top_n=top_n, offset=offset)
+        if not recommendations and offset == 0:
+            recommendations = recommender.get_popular_items(top_n)
+        recommender.record_impressions(user_id, recommendations)
+        self.send_json(200, build_response(200, recommendations, "success"))
+
+    def handle_batch_recommendations(self, params):
+        raw_user_ids = params.get('user_ids', '')
+        if isinstance(raw_user_ids, list):
+            raw_user_ids = ','.join(str(user_id) for user_id in raw_user_ids)
+        user_ids = parse_user_ids(raw_user_ids)
+        if not user_ids:
+            self.send_json(400, build_response(400, None, "参数错误。用法: /batch_recommendations?user_ids=<id1,id2,...>&method=<method>&top_n=<top_n>"))
+            return
+
+        method = params.get('method', 'hybrid')
+        if method not in VALID_METHODS:
+            method = 'hybrid'
+        top_n = parse_top_n(params.get('top_n'))
+
+        results = self.server.recommender.get_batch_recommendations(user_ids, method=method, top_n=top_n)
+        self.send_json(200, build_response(200, {str(user_id): recs for user_id, recs in results.items()}, "success"))
+
+    def handle_feedback(self, params):
+        try:
+            user_id = int(params.get('user_id', ''))
+            tweets_id = int(params.get('tweets_id', ''))
+        except (TypeError, ValueError):
+            user_id, tweets_id = 0, 0
+        feedback = str(params.get('feedback', '')).lower()
+        if user_id <= 0 or tweets_id <= 0 or feedback not in ('like', 'dislike'):
+            self.send_json(400, build_response(400, None, "参数错误。用法: /feedback {\"user_id\": <user_id>, \"tweets_id\": <tweets_id>, \"feedback\": \"like|dislike\"}"))
+            return
+
+        self.server.recommender.record_feedback(user_id, tweets_id, feedback)
+        self.send_json(200, build_response(200, None, "success"))
+
+    def handle_invalidate(self, params):
+        try:
+            user_id = int(params.get('user_id', ''))
+        except (TypeError, ValueError):
+            user_id = 0
+        if user_id <= 0:
+            self.send_json(400, build_response(400, None, "参数错误。用法: /cache/invalidate {\"user_id\": <user_id>}"))
+            return
+
+        self.server.recommender.invalidate_user(user_id)
+        self.send_json(200, build_response(200, None, "success"))
+
+    def handle_popular(self, params):
+        top_n = parse_top_n(params.get('top_n'))
+        popular_items = self.server.recommender.get_popular_items(top_n)
+        self.send_json(200, build_response(200, popular_items, "success"))
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    """常驻推荐服务，进程内持有唯一的 Recommender 实例"""
+
+    daemon_threads = True
+
+    def __init__(self, server_address):
+        super().__init__(server_address, RecommendationHandler)
+        self.recommender = Recommender(background_refresh=True)
+        feedback_writer.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推荐服务常驻进程')
+    parser.add_argument('--host', default=Config.SERVER_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT, help='监听端口')
+    args = parser.parse_args()
+
+    server = RecommendationServer((args.host, args.port))
+
+    # 部署/重启时的 SIGTERM 与 Ctrl+C 一样退出 serve_forever，确保缓冲中的反馈写入数据库
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    logger.info("推荐服务已启动: http://%s:%s", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("推荐服务正在停止")
+    finally:
+        server.server_close()
+        feedback_writer.stop()
+
+
+if __name__ == "__main__":
+    main()